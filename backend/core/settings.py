@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -34,7 +35,6 @@ ALLOWED_HOSTS = [
 ]
 
 
-
 # Application definition
 
 INSTALLED_APPS = [
@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "trips.middleware.ServerTimingMiddleware",
+    "trips.middleware.CompressionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -93,7 +95,7 @@ WSGI_APPLICATION = "core.wsgi.application"
 
 # Allow Vercel frontend domain
 CORS_ALLOWED_ORIGINS = [
-    "https://trip-eld-f2vc.vercel.app/",
+    "https://trip-eld-f2vc.vercel.app",
 ]
 
 # Database
@@ -103,9 +105,23 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # keep connections open between requests (seconds)
+        "CONN_MAX_AGE": 60,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"timeout": 20},
     }
 }
 
+# Applied to every new SQLite connection (trips.signals.configure_sqlite).
+# WAL: readers don't block the writer and vice versa.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -20000,  # KiB
+    "mmap_size": 128 * 1024 * 1024,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -147,3 +163,190 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Geocode cache (trips.services.geocode_cache)
+# In-process LRU in front of the GeocodedLocation table; TTL in seconds.
+
+GEOCODE_CACHE_MAX_ENTRIES = 2048
+GEOCODE_CACHE_TTL = 60 * 60 * 24 * 30
+
+# Local gazetteer (trips.services.gazetteer), consulted before the cache
+# and Nominatim and used for autocomplete. A CSV (name,lat,lon[,kind]
+# [,weight]) or SQLite file with those columns in GAZETTEER_TABLE.
+
+GAZETTEER_PATH = None
+GAZETTEER_TABLE = "places"
+
+
+# Upstream fan-out (trips.services.pool / routing.geocode_many)
+# Threads shared by all requests in a worker; deadline in seconds.
+
+UPSTREAM_FANOUT_WORKERS = 8
+ROUTING_FANOUT_TIMEOUT = 25
+
+
+# Route cache (trips.services.route_cache)
+# "routes" is file-based so every worker on the box shares hits; point
+# ROUTE_CACHE_ALIAS at "default" to keep it in local memory instead.
+# TIMEOUT / MAX_ENTRIES bound how long and how many routes are kept.
+# "breaker" holds only circuit breaker state, so culling routes can
+# never reset an open circuit.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "routes": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": Path(tempfile.gettempdir()) / "tripeld-route-cache",
+        "TIMEOUT": 60 * 60 * 24,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    "breaker": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": Path(tempfile.gettempdir()) / "tripeld-breaker",
+        "TIMEOUT": None,
+    },
+}
+
+ROUTE_CACHE_ALIAS = "routes"
+ROUTE_CACHE_PRECISION = 4
+
+
+# Upstream HTTP client (trips.services.upstream)
+# One keep-alive Session per worker; timeouts in seconds. 429/5xx are
+# retried with jittered exponential backoff, honouring Retry-After up to
+# UPSTREAM_RETRY_AFTER_MAX. Failed connects are retried at most
+# UPSTREAM_CONNECT_RETRIES times; read timeouts are never retried, so a
+# hung upstream costs one read timeout.
+
+UPSTREAM_POOL_CONNECTIONS = 4
+UPSTREAM_POOL_MAXSIZE = 16
+UPSTREAM_CONNECT_TIMEOUT = 3.05
+UPSTREAM_READ_TIMEOUT = 10
+OSRM_READ_TIMEOUT = 15
+UPSTREAM_MAX_RETRIES = 3
+UPSTREAM_CONNECT_RETRIES = 1
+UPSTREAM_BACKOFF_FACTOR = 0.5
+UPSTREAM_RETRY_AFTER_MAX = 10
+
+
+# OSRM circuit breaker (trips.services.circuit_breaker)
+# State lives in CACHES[CIRCUIT_BREAKER_ALIAS] so all workers share it;
+# keep that alias to itself, as a cull evicting breaker keys closes the
+# circuit.
+# Opens after OSRM_BREAKER_FAILURE_THRESHOLD consecutive failures (calls
+# slower than OSRM_BREAKER_SLOW_CALL_SECONDS count as failures); after
+# OSRM_BREAKER_RESET_TIMEOUT seconds one probe request is let through.
+
+CIRCUIT_BREAKER_ALIAS = "breaker"
+OSRM_BREAKER_FAILURE_THRESHOLD = 5
+OSRM_BREAKER_SLOW_CALL_SECONDS = 5
+OSRM_BREAKER_RESET_TIMEOUT = 30
+
+
+# Request de-duplication (trips.services.idempotency)
+# Create responses are replayed for repeats of an Idempotency-Key for
+# IDEMPOTENCY_KEY_TTL seconds, and for identical bodies for
+# IDEMPOTENCY_FINGERPRINT_TTL seconds, per client, rebuilt from the
+# trip's stored plan. Records and the cross-worker lock live in the
+# database (IdempotencyRecord); a lock is given up after
+# IDEMPOTENCY_LOCK_TIMEOUT seconds.
+
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+IDEMPOTENCY_FINGERPRINT_TTL = 10
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+
+# Trip history (GET /api/trips/history/): cursor pages, `limit` per page.
+
+TRIP_HISTORY_PAGE_SIZE = 50
+TRIP_HISTORY_MAX_PAGE_SIZE = 200
+
+
+# Multi-stop trips (trips.services.matrix)
+# Extra stops between pickup and dropoff are ordered from a pairwise
+# OSRM table whose legs are cached in the "routes" cache.
+
+TRIP_MAX_STOPS = 25
+
+
+# Batch planning (POST /api/trips/batch/)
+# Geocoding and per-trip planning run on their own pool so large batches
+# don't starve interactive requests; timeout in seconds per stage.
+
+BATCH_PLANNING_WORKERS = 8
+BATCH_PLANNING_MAX_ITEMS = 500
+BATCH_PLANNING_TIMEOUT = 300
+
+
+# Background planning jobs (POST /api/trips/create/?mode=job)
+# Jobs run on an in-process pool; state is kept in the TripJob table so
+# any worker can answer polls and event streams. A queued or running job
+# not updated for TRIP_JOB_STALE_SECONDS lost its worker (crash, restart)
+# and is reported failed. Each event stream holds a server thread for up
+# to JOB_EVENTS_MAX_SECONDS.
+
+TRIP_JOB_WORKERS = 4
+TRIP_JOB_STALE_SECONDS = 300
+JOB_EVENTS_POLL_INTERVAL = 0.5
+JOB_EVENTS_MAX_SECONDS = 120
+
+
+# HOS engine used by the planner: "event" (trips.services.hos_engine) or
+# "reference" (trips.services.hos_calculator), whose output is identical,
+# or "memo" (trips.services.hos_memo): "event" memoized on inputs rounded
+# to HOS_MEMO_PRECISION decimal places, at most HOS_MEMO_MAX_ENTRIES kept.
+
+HOS_ENGINE = "memo"
+HOS_MEMO_MAX_ENTRIES = 2048
+HOS_MEMO_PRECISION = 2
+
+
+# What-if sweep (POST /api/trips/hos/sweep/): upper bound on grid cells
+
+HOS_SWEEP_MAX_CELLS = 200_000
+
+
+# Offline routing (trips.services.road_graph)
+# Road graph built with `manage.py build_road_graph` (.npz). LOCAL_ROUTING
+# is "fallback" (answer when OSRM fails, before the straight-line
+# estimate), "primary" (route locally, OSRM only if that fails) or "off".
+# Points farther than ROAD_GRAPH_MAX_SNAP_MILES from any node can't route.
+
+ROAD_GRAPH_PATH = None
+LOCAL_ROUTING = "fallback"
+ROAD_GRAPH_MAX_SNAP_MILES = 25
+
+
+# Benchmarks (python manage.py bench): --check fails when a benchmark is
+# more than this fraction slower than trips/benchmarks/baseline.json,
+# measured relative to a reference loop and confirmed by a second run.
+
+BENCHMARK_REGRESSION_THRESHOLD = 0.25
+
+
+# Metrics (trips.services.metrics)
+# Per-stage spans for the Server-Timing header and the /metrics endpoint.
+
+METRICS_ENABLED = True
+
+
+# Responses (trips.renderers, trips.middleware.CompressionMiddleware)
+# JSON is rendered with orjson when installed. Bodies of at least
+# COMPRESSION_MIN_SIZE bytes are brotli (if installed) or gzip encoded
+# for clients that accept it; streaming responses are never compressed.
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "trips.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # One reverse proxy in front of the app: the last X-Forwarded-For
+    # entry is the client address (throttling, idempotency scoping).
+    "NUM_PROXIES": 1,
+}
+
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
@@ -0,0 +1,40 @@
+"""
+API-only settings for trips workers: DJANGO_SETTINGS_MODULE=core.settings_api.
+
+Everything in core.settings, minus what the JSON API never uses: the
+admin, sessions, auth, messages, static files and templates, their
+middleware and the browsable API. Workers start faster and import
+fewer modules; compare with
+`python manage.py importtime core.settings core.settings_api`.
+Migrations and the admin still run under core.settings.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    "rest_framework",
+    "trips",
+    "corsheaders",
+]
+
+MIDDLEWARE = [
+    "trips.middleware.ServerTimingMiddleware",
+    "trips.middleware.CompressionMiddleware",
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+ROOT_URLCONF = "core.urls_api"
+
+TEMPLATES = []
+
+# Without django.contrib.auth there are no users: no authentication,
+# and request.user is None.
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,  # noqa: F405
+    "DEFAULT_RENDERER_CLASSES": ["trips.renderers.FastJSONRenderer"],
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
+    "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.AllowAny"],
+    "UNAUTHENTICATED_USER": None,
+}
@@ -18,7 +18,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from trips.views import MetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/trips/", include("trips.urls")),
+    path("metrics", MetricsView.as_view()),
 ]
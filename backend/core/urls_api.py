@@ -0,0 +1,13 @@
+"""
+URL configuration for the API-only profile (core.settings_api): the
+trips API and /metrics, without the admin.
+"""
+
+from django.urls import path, include
+
+from trips.views import MetricsView
+
+urlpatterns = [
+    path("api/trips/", include("trips.urls")),
+    path("metrics", MetricsView.as_view()),
+]
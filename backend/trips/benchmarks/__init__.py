@@ -0,0 +1,270 @@
+"""
+Microbenchmarks for the routing and HOS services (`manage.py bench`).
+
+Upstream responses come from the recorded fixtures next to this module,
+so runs need no network; `manage.py bench --record` refreshes them.
+Results are per-call seconds (median of several repeats), compared
+against the JSON baseline in baseline.json relative to a fixed
+reference loop timed alongside, so machine load cancels out.
+"""
+
+import json
+import logging
+import platform
+import statistics
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+from django.test.utils import override_settings
+
+from ..models import Trip
+from ..services import routing, upstream
+from ..services.hos_calculator import calculate_hos
+from ..services.hos_engine import calculate_hos_fast
+from ..services.path_index import PathIndex
+from ..services.planner import build_plan, enrich_hos_logs
+
+BENCH_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+
+# Stops of the recorded route, in order
+FIXTURE_LOCATIONS = ("Dallas, TX", "Oklahoma City, OK", "Chicago, IL")
+
+# name -> (total_trip_hours, total_distance_miles, cycle_used, fuel_stops)
+HOS_SCENARIOS = {
+    "short": (8.5, 467.5, 10, []),
+    "long": (55.0, 3025.0, 0, []),
+    "cycle_exhausted": (40.0, 2200.0, 60, []),
+    "fuel_stop": (20.0, 1100.0, 5, [{"mile_marker": 1000, "reason": "Fuel stop"}]),
+}
+
+# name -> setup function returning the zero-argument callable to time
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def load_fixture(name):
+    with open(FIXTURES_DIR / f"{name}.json") as f:
+        return json.load(f)
+
+
+def fixture_points(nominatim=None):
+    if nominatim is None:
+        nominatim = load_fixture("nominatim")
+    return [
+        (float(nominatim[loc][0]["lat"]), float(nominatim[loc][0]["lon"]))
+        for loc in FIXTURE_LOCATIONS
+    ]
+
+
+def fixture_route():
+    return routing._parse_osrm_route(load_fixture("osrm_route"), fixture_points())
+
+
+def fixture_trip(cycle_used=0):
+    # unsaved: enrichment only reads these fields
+    return Trip(
+        current_location=FIXTURE_LOCATIONS[0],
+        pickup_location=FIXTURE_LOCATIONS[1],
+        dropoff_location=FIXTURE_LOCATIONS[2],
+        current_cycle_used_hours=cycle_used,
+        created_at=datetime(2025, 1, 6, 8, 0, tzinfo=timezone.utc),
+    )
+
+
+def _register_hos(name, engine, args):
+    @benchmark(name)
+    def setup():
+        return lambda: engine(*args)
+
+
+for scenario, args in HOS_SCENARIOS.items():
+    _register_hos(f"hos.reference.{scenario}", calculate_hos, args)
+    _register_hos(f"hos.event.{scenario}", calculate_hos_fast, args)
+
+
+@benchmark("routing.fuel_stops")
+def bench_fuel_stops():
+    return lambda: routing.calculate_fuel_stops(2750.5)
+
+
+@benchmark("routing.parse_osrm")
+def bench_parse_osrm():
+    data = load_fixture("osrm_route")
+    points = fixture_points()
+    return lambda: routing._parse_osrm_route(data, points)
+
+
+@benchmark("routing.fallback")
+def bench_fallback():
+    # OSRM unreachable and nothing cached: the haversine fallback path.
+    # The breaker is bypassed: its state is shared by every worker on the
+    # host, and once open it would short-circuit the path being timed.
+    points = fixture_points()
+    upstream_down = mock.patch.object(
+        upstream, "get", side_effect=ConnectionError("benchmark: no network")
+    )
+    cache_miss = mock.patch.object(routing.route_cache, "get", return_value=None)
+    breaker_closed = mock.patch.multiple(
+        routing.osrm_breaker,
+        allow=lambda: True,
+        record_failure=lambda: None,
+        record_success=lambda elapsed: None,
+    )
+
+    def run():
+        with upstream_down, cache_miss, breaker_closed:
+            return routing.route_between(points)
+
+    return run
+
+
+@benchmark("plan.path_index")
+def bench_path_index():
+    distance, _, path, _ = fixture_route()
+    return lambda: PathIndex(path, distance)
+
+
+@benchmark("plan.enrich")
+def bench_enrich():
+    distance, duration, _, _ = fixture_route()
+    trip = fixture_trip()
+    hos_logs = calculate_hos_fast(
+        duration, distance, 0, routing.calculate_fuel_stops(distance)
+    )
+    return lambda: enrich_hos_logs(trip, distance, duration, hos_logs)
+
+
+@benchmark("plan.build")
+def bench_build_plan():
+    route = fixture_route()
+    trip = fixture_trip()
+
+    def run():
+        # the plain event engine, so HOS memo hits don't skew the timing
+        with override_settings(HOS_ENGINE="event"):
+            return build_plan(trip, route)
+
+    return run
+
+
+def reference_loop():
+    """
+    Fixed pure-Python work timed alongside every benchmark. Its time
+    tracks how fast this machine is running right now (CPU contention,
+    frequency scaling), so benchmarks are compared relative to it.
+    """
+    total = 0.0
+    rows = []
+    for i in range(500):
+        total += (i * 0.5) ** 0.5
+        rows.append({"i": i, "total": total})
+    return sorted(rows, key=lambda row: -row["total"])[0]
+
+
+def run_benchmarks(names=None, repeat=5):
+    """
+    Time each benchmark (all of them by default) and return {name:
+    {"seconds": median per-call time, "relative": median ratio to
+    reference_loop() timed just before, "number": calls per repeat}}.
+    """
+    reference = timeit.Timer(reference_loop)
+    reference_number, _ = reference.autorange()
+    results = {}
+    for name in names or BENCHMARKS:
+        timer = timeit.Timer(BENCHMARKS[name]())
+        # keep the routing fallbacks' warnings out of the report
+        logging.disable(logging.WARNING)
+        try:
+            number, _ = timer.autorange()
+            seconds, relative = [], []
+            for _ in range(repeat):
+                unit = reference.timeit(reference_number) / reference_number
+                seconds.append(timer.timeit(number) / number)
+                relative.append(seconds[-1] / unit)
+        finally:
+            logging.disable(logging.NOTSET)
+        results[name] = {
+            "seconds": statistics.median(seconds),
+            "relative": statistics.median(relative),
+            "number": number,
+        }
+    return results
+
+
+def median_results(runs):
+    """Per-benchmark medians of several run_benchmarks() results."""
+    return {
+        name: {
+            field: statistics.median_low(run[name][field] for run in runs)
+            for field in runs[0][name]
+        }
+        for name in runs[0]
+    }
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)["benchmarks"]
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    data = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline. Returns one row per benchmark:
+    (name, baseline_seconds or None, seconds, ratio or None, regressed),
+    where regressed means more than `threshold` (0.25 = 25%) slower.
+    The ratio is of the times relative to reference_loop() when both
+    sides have them, so a slower or busier machine doesn't count.
+    """
+    rows = []
+    for name, result in results.items():
+        seconds = result["seconds"]
+        base = baseline.get(name, {}).get("seconds")
+        ratio = seconds / base if base else None
+        base_relative = baseline.get(name, {}).get("relative")
+        if ratio is not None and base_relative and "relative" in result:
+            ratio = result["relative"] / base_relative
+        regressed = ratio is not None and ratio > 1 + threshold
+        rows.append((name, base, seconds, ratio, regressed))
+    return rows
+
+
+def record_fixtures():
+    """Re-record the upstream fixtures from live Nominatim and OSRM."""
+    nominatim = {}
+    for location in FIXTURE_LOCATIONS:
+        response = upstream.get(
+            "https://nominatim.openstreetmap.org/search",
+            params={"q": location, "format": "json", "limit": 1},
+        )
+        nominatim[location] = response.json()
+
+    url, params = routing._osrm_request(fixture_points(nominatim))
+    osrm = upstream.get(url, params=params).json()
+
+    with open(FIXTURES_DIR / "nominatim.json", "w") as f:
+        json.dump(nominatim, f, indent=2)
+    with open(FIXTURES_DIR / "osrm_route.json", "w") as f:
+        json.dump(osrm, f, separators=(",", ":"))
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trips import benchmarks
+
+
+class Command(BaseCommand):
+    # timings only; don't fail on unrelated deployment checks
+    requires_system_checks = []
+    help = (
+        "Run the routing/HOS microbenchmarks against recorded upstream "
+        "fixtures and compare them with the JSON baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help="Only run benchmarks whose name starts with one of these.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if any benchmark regressed beyond the threshold.",
+        )
+        parser.add_argument(
+            "--save",
+            action="store_true",
+            help="Write the results as the new baseline.",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=str(benchmarks.BASELINE_PATH),
+            help="Baseline JSON file (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=getattr(settings, "BENCHMARK_REGRESSION_THRESHOLD", 0.25),
+            help="Allowed slowdown as a fraction, e.g. 0.25 for 25%%.",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=1,
+            help="Full runs to take the median of; use several with --save.",
+        )
+        parser.add_argument(
+            "--record",
+            action="store_true",
+            help="Re-record the upstream fixtures from live Nominatim/OSRM first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["record"]:
+            benchmarks.record_fixtures()
+            self.stdout.write("Recorded fixtures in %s" % benchmarks.FIXTURES_DIR)
+
+        names = [
+            name
+            for name in benchmarks.BENCHMARKS
+            if not options["names"]
+            or any(name.startswith(prefix) for prefix in options["names"])
+        ]
+        if not names:
+            raise CommandError("No benchmark matches %s." % ", ".join(options["names"]))
+
+        results = benchmarks.median_results(
+            [
+                benchmarks.run_benchmarks(names, repeat=options["repeat"])
+                for _ in range(max(options["runs"], 1))
+            ]
+        )
+
+        try:
+            baseline = benchmarks.load_baseline(options["baseline"])
+        except FileNotFoundError:
+            baseline = {}
+
+        threshold = options["threshold"]
+        rows = benchmarks.compare(results, baseline, threshold)
+        regressed = {row[0]: row[3] for row in rows if row[4]}
+        if regressed:
+            # noise rarely repeats: a regression has to show in a second run too
+            again = benchmarks.run_benchmarks(list(regressed), repeat=options["repeat"])
+            for name, _, _, ratio, _ in benchmarks.compare(again, baseline, threshold):
+                if ratio < regressed[name]:
+                    results[name] = again[name]
+            rows = benchmarks.compare(results, baseline, threshold)
+        self.stdout.write(
+            f"{'benchmark':<32} {'baseline':>12} {'current':>12} {'change':>9}"
+        )
+        for name, base, seconds, ratio, regressed in rows:
+            change = f"{(ratio - 1) * 100:+.1f}%" if ratio is not None else "new"
+            line = f"{name:<32} {_fmt(base):>12} {_fmt(seconds):>12} {change:>9}"
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+
+        if options["save"]:
+            benchmarks.save_baseline(results, options["baseline"])
+            self.stdout.write(
+                self.style.SUCCESS("Saved baseline %s" % options["baseline"])
+            )
+
+        regressions = [row[0] for row in rows if row[4]]
+        if options["check"] and regressions:
+            raise CommandError(
+                "%d benchmark(s) regressed by more than %d%%: %s"
+                % (len(regressions), threshold * 100, ", ".join(regressions))
+            )
+
+
+def _fmt(seconds):
+    if seconds is None:
+        return "-"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} us"
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.services.road_graph import RoadGraph
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the offline routing graph (.npz) from node and edge CSV files; "
+        "point ROAD_GRAPH_PATH at the output."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("nodes", help="CSV with id,lat,lon")
+        parser.add_argument(
+            "edges", help="CSV with source,target,length_m,duration_s[,oneway]"
+        )
+        parser.add_argument("output", help="Output .npz file")
+
+    def handle(self, *args, **options):
+        try:
+            graph = RoadGraph.from_csv(options["nodes"], options["edges"])
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f"Could not build road graph: {e!r}")
+        graph.save(options["output"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {options['output']}: {graph.node_count} nodes, "
+                f"{graph.edge_count} edges"
+            )
+        )
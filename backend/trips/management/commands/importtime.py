@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: what a worker does before its first request.
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Report worker start-up cost per settings module: time to load "
+        "settings, apps, URLconf and middleware in a fresh interpreter, "
+        "modules imported, and the packages that cost the most."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "settings_modules",
+            nargs="*",
+            help="Settings modules to compare, e.g. core.settings "
+            "core.settings_api (default: the current one).",
+        )
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=10,
+            help="Packages to list per settings module, by import time.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Start-ups per settings module; the fastest is reported.",
+        )
+
+    def handle(self, *args, **options):
+        modules = options["settings_modules"] or [os.environ["DJANGO_SETTINGS_MODULE"]]
+        for module in modules:
+            runs = [self._start(module) for _ in range(max(options["repeat"], 1))]
+            result, packages = min(runs, key=lambda run: run[0]["seconds"])
+
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(module)
+                + f"  {result['seconds'] * 1e3:.0f} ms, {result['modules']} modules"
+            )
+            ranked = sorted(packages.items(), key=lambda item: -item[1])
+            for package, micros in ranked[: options["top"]]:
+                self.stdout.write(f"  {package:<32} {micros / 1e3:>8.1f} ms")
+
+    def _start(self, module):
+        """(result, {top-level package: self import time in us}) of one run."""
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=module)
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode:
+            raise CommandError(
+                f"Start-up with {module} failed:\n{proc.stderr.strip()[-2000:]}"
+            )
+        return json.loads(proc.stdout.splitlines()[-1]), _package_times(proc.stderr)
+
+
+def _package_times(report):
+    """Sum `python -X importtime` self times by top-level package."""
+    packages = defaultdict(int)
+    for line in report.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        packages[name.strip().split(".")[0]] += int(self_us)
+    return packages
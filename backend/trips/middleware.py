@@ -0,0 +1,115 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from .services import metrics
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r"\bbr\b")
+
+
+class ServerTimingMiddleware:
+    """
+    Collect the stage spans recorded while serving a request and report
+    them, plus the total, in a Server-Timing header. DRF responses are
+    rendered after the view returns; that time shows up as "render".
+    Streaming responses only carry the spans finished before the first
+    byte. Sync and async capable, so async views stay on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not metrics.enabled():
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        spans, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._add_header(response, spans, start)
+
+    async def __acall__(self, request):
+        if not metrics.enabled():
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        spans, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._add_header(response, spans, start)
+
+    def _add_header(self, response, spans, start):
+        spans.append(("total", time.perf_counter() - start))
+        response["Server-Timing"] = metrics.server_timing(spans)
+        return response
+
+    def process_template_response(self, request, response):
+        if metrics.enabled():
+            start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda _: metrics.record("render", time.perf_counter() - start)
+            )
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware for payloads of at least COMPRESSION_MIN_SIZE bytes
+    (smaller ones aren't worth the CPU), preferring brotli for complete
+    responses when the `brotli` package is installed and the client
+    accepts "br". Streaming responses (NDJSON plans, SSE job events) are
+    passed through untouched: gzip would hold their lines back until it
+    has filled a block, defeating the point of streaming.
+    """
+
+    def process_response(self, request, response):
+        min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+        if response.streaming or len(response.content) < min_size:
+            return response
+        with metrics.span("compress"):
+            accept = request.META.get("HTTP_ACCEPT_ENCODING", "")
+            if (
+                brotli is not None
+                and not response.has_header("Content-Encoding")
+                and re_accepts_br.search(accept)
+            ):
+                return self._brotli(response)
+            return super().process_response(request, response)
+
+    def _brotli(self, response):
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(
+            response.content,
+            quality=getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5),
+        )
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        # as GZipMiddleware: the encoded body no longer matches a strong ETag
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
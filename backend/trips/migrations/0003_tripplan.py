@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0002_geocodedlocation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TripPlan",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_distance_miles", models.FloatField()),
+                ("total_duration_hours", models.FloatField()),
+                ("path_polyline", models.TextField()),
+                ("waypoints", models.JSONField(default=list)),
+                ("fuel_stops", models.JSONField(default=list)),
+                ("rest_stops", models.JSONField(default=list)),
+                ("hos_logs", models.JSONField(default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "trip",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="plan",
+                        to="trips.trip",
+                    ),
+                ),
+            ],
+        ),
+    ]
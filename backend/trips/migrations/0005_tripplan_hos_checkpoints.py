@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0004_tripjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripplan",
+            name="hos_checkpoints",
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0005_tripplan_hos_checkpoints"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="trip",
+            name="optimize_stop_order",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name="trip",
+            name="stops",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="tripplan",
+            name="stop_order",
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0006_trip_stops"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripplan",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
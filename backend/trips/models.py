@@ -1,11 +1,20 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
+from .services.geometry import decode_polyline, encode_polyline
+
 
 class Trip(models.Model):
     # Location inputs from user
     current_location = models.CharField(max_length=255)
     pickup_location = models.CharField(max_length=255)
     dropoff_location = models.CharField(max_length=255)
+    # Further stops between pickup and dropoff (location strings)
+    stops = models.JSONField(default=list, blank=True)
+    # Reorder `stops` to minimize drive time (pickup and dropoff stay put)
+    optimize_stop_order = models.BooleanField(default=True)
 
     # HOS input
     current_cycle_used_hours = models.FloatField()
@@ -13,5 +22,163 @@ class Trip(models.Model):
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # History listing: newest first, optionally for one location
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="trip_created_idx"),
+            models.Index(
+                fields=["current_location", "created_at"], name="trip_current_idx"
+            ),
+            models.Index(
+                fields=["pickup_location", "created_at"], name="trip_pickup_idx"
+            ),
+            models.Index(
+                fields=["dropoff_location", "created_at"], name="trip_dropoff_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"Trip from {self.pickup_location} to {self.dropoff_location}"
+
+
+class GeocodedLocation(models.Model):
+    # Normalized lookup key, see services.geocode_cache.normalize_location
+    normalized_query = models.CharField(max_length=255, unique=True)
+    # First raw string that produced this entry (for debugging)
+    query = models.CharField(max_length=255)
+
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    hits = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.query} ({self.latitude}, {self.longitude})"
+
+
+class TripPlan(models.Model):
+    """
+    Computed plan for a Trip, stored so it can be served again without
+    touching Nominatim/OSRM. The route geometry is packed as a polyline6
+    string rather than a JSON list of [lat, lon] lists.
+    """
+
+    PATH_PRECISION = 6
+
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, related_name="plan")
+
+    total_distance_miles = models.FloatField()
+    total_duration_hours = models.FloatField()
+    path_polyline = models.TextField()
+    waypoints = models.JSONField(default=list)
+    fuel_stops = models.JSONField(default=list)
+    rest_stops = models.JSONField(default=list)
+    hos_logs = models.JSONField(default=list)
+    # Per-day HOS engine state (hos_engine.make_checkpoint), for re-planning
+    hos_checkpoints = models.JSONField(default=list)
+    # Locations in visiting order, for multi-stop trips only
+    stop_order = models.JSONField(default=list)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Plan for trip {self.trip_id}"
+
+    @classmethod
+    def from_plan(cls, trip, plan, checkpoints=None):
+        """Unsaved TripPlan for a planner.build_plan() result."""
+        route_info = plan["route_info"]
+        return cls(
+            trip=trip,
+            total_distance_miles=route_info["total_distance_miles"],
+            total_duration_hours=route_info["total_duration_hours"],
+            path_polyline=encode_polyline(route_info["path"], cls.PATH_PRECISION),
+            waypoints=route_info["waypoints"],
+            fuel_stops=route_info["fuel_stops"],
+            rest_stops=route_info["rest_stops"],
+            hos_logs=plan["hos_logs"],
+            hos_checkpoints=checkpoints or [],
+            stop_order=route_info.get("stop_order", []),
+        )
+
+    def as_plan(self):
+        """The stored plan in the same shape planner.build_plan() returns."""
+        route_info = {
+            "total_distance_miles": self.total_distance_miles,
+            "total_duration_hours": self.total_duration_hours,
+            "fuel_stops": self.fuel_stops,
+            "path": decode_polyline(self.path_polyline, self.PATH_PRECISION),
+            "waypoints": self.waypoints,
+            "rest_stops": self.rest_stops,
+            "cached": True,
+        }
+        if self.stop_order:
+            route_info["stop_order"] = self.stop_order
+        return {
+            "route_info": route_info,
+            "hos_logs": self.hos_logs,
+        }
+
+
+class TripJob(models.Model):
+    """
+    Background planning job for a Trip (create endpoint with ?mode=job).
+    State lives in the database so any worker can answer status polls.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name="jobs")
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    stage = models.CharField(max_length=16, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job {self.id} ({self.status})"
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Stored create response for trips.services.idempotency. The unique
+    `key` doubles as the cross-worker lock: a row without a status is a
+    request still being served, held until `expires_at`.
+
+    A planned trip's response is rebuilt from its TripPlan, so only the
+    trip is kept; `response` holds the body of anything else (validation
+    errors, queued jobs).
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    body_hash = models.CharField(max_length=64)
+    status = models.PositiveSmallIntegerField(null=True)
+    trip = models.ForeignKey(
+        Trip, null=True, on_delete=models.CASCADE, related_name="+"
+    )
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Idempotency record {self.key[:12]} ({self.status or 'running'})"
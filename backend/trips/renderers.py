@@ -0,0 +1,43 @@
+"""
+JSON rendering for the trips API: orjson when it is installed (several
+times faster than the stdlib encoder on large plans), json otherwise.
+"""
+
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional; fall back to the stdlib encoder
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """Compact JSON bytes for `data`, using DRF's encoder for odd types."""
+    if orjson is not None:
+        return orjson.dumps(
+            data,
+            default=_encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+    return json.dumps(data, cls=JSONEncoder, separators=(",", ":")).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that renders with dumps(). Indented output (an
+    `indent` parameter on the Accept header, or the browsable API) still
+    goes through DRF's own renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -1,3 +1,6 @@
+from math import isfinite
+
+from django.conf import settings
 from rest_framework import serializers
 from .models import Trip
 
@@ -6,3 +9,93 @@ class TripSerializer(serializers.ModelSerializer):
     class Meta:
         model = Trip
         fields = "__all__"
+
+    def validate_stops(self, value):
+        max_stops = getattr(settings, "TRIP_MAX_STOPS", 25)
+        if not isinstance(value, list) or not all(
+            isinstance(stop, str) and stop.strip() for stop in value
+        ):
+            raise serializers.ValidationError("Expected a list of locations.")
+        if len(value) > max_stops:
+            raise serializers.ValidationError(
+                f"A trip may have at most {max_stops} extra stops."
+            )
+        return value
+
+
+class TripHistorySerializer(TripSerializer):
+    # From the trip's plan; null while it has none (e.g. a queued job)
+    total_distance_miles = serializers.FloatField(read_only=True, allow_null=True)
+    total_duration_hours = serializers.FloatField(read_only=True, allow_null=True)
+
+
+class GridField(serializers.Field):
+    """
+    A list of hours, given either explicitly ([0, 5.5, 11]) or as a range
+    ({"start": 0, "stop": 70, "step": 1}, stop inclusive).
+    """
+
+    default_error_messages = {
+        "invalid": "Expected a list of numbers or a {{start, stop, step}} object.",
+        "empty": "The grid must contain at least one value.",
+        "negative": "Hours must not be negative.",
+        "too_many": "The grid may contain at most {max_values} values.",
+    }
+
+    def __init__(self, max_values=2000, **kwargs):
+        self.max_values = max_values
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            try:
+                start = float(data.get("start", 0))
+                stop = float(data["stop"])
+                step = float(data.get("step", 1))
+            except (KeyError, TypeError, ValueError, OverflowError):
+                self.fail("invalid")
+            if not all(isfinite(v) for v in (start, stop, step)):
+                self.fail("invalid")
+            if step <= 0 or stop < start:
+                self.fail("invalid")
+            # compared before int(): a tiny step can overflow to inf
+            steps = (stop - start) / step + 1e-9
+            if steps >= self.max_values:
+                self.fail("too_many", max_values=self.max_values)
+            values = [round(start + i * step, 4) for i in range(int(steps) + 1)]
+        elif isinstance(data, list):
+            try:
+                values = [float(v) for v in data]
+            except (TypeError, ValueError, OverflowError):
+                self.fail("invalid")
+            if not all(isfinite(v) for v in values):
+                self.fail("invalid")
+        else:
+            self.fail("invalid")
+
+        if not values:
+            self.fail("empty")
+        if len(values) > self.max_values:
+            self.fail("too_many", max_values=self.max_values)
+        if min(values) < 0:
+            self.fail("negative")
+        return values
+
+    def to_representation(self, value):
+        return value
+
+
+class HOSSweepSerializer(serializers.Serializer):
+    trip_hours = GridField()
+    cycle_used_hours = GridField(
+        required=False, default=[float(h) for h in range(0, 71)]
+    )
+    avg_speed_mph = serializers.FloatField(required=False, default=55.0, min_value=1)
+    fuel_stops = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+
+class ReplanSerializer(serializers.Serializer):
+    # Day to re-plan from (1-based); earlier days are kept as planned
+    from_day = serializers.IntegerField(min_value=1)
+    # Driving hours left as of the start of from_day
+    remaining_trip_hours = serializers.FloatField(min_value=0)
@@ -0,0 +1,112 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for an upstream service, with its state kept in
+    Django's cache so every worker sharing the cache alias (the
+    file-based "breaker" cache by default) sees the same circuit. The
+    alias should hold nothing else: a cull that evicts these keys would
+    silently close an open circuit.
+
+    Closed: calls go through. A failure or a call slower than
+    `slow_call_seconds` bumps a consecutive-failure count; a fast success
+    resets it. At `failure_threshold` the circuit opens and allow()
+    answers False, so callers fall back immediately. After
+    `reset_timeout` seconds it is half-open: a single probe call is let
+    through; its success closes the circuit, its failure re-opens it.
+
+    Counts are updated without cross-process locking, so the threshold
+    is approximate under concurrent failures; that is fine for shedding
+    load.
+    """
+
+    def __init__(self, name, alias=None):
+        self.name = name
+        self.alias = alias or getattr(settings, "CIRCUIT_BREAKER_ALIAS", "breaker")
+        self._failures_key = f"breaker:v1:{name}:failures"
+        self._opened_key = f"breaker:v1:{name}:opened_at"
+        self._probe_key = f"breaker:v1:{name}:probe"
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _setting(self, suffix, default):
+        return getattr(settings, f"{self.name.upper()}_BREAKER_{suffix}", default)
+
+    @property
+    def failure_threshold(self):
+        return self._setting("FAILURE_THRESHOLD", 5)
+
+    @property
+    def slow_call_seconds(self):
+        return self._setting("SLOW_CALL_SECONDS", 5)
+
+    @property
+    def reset_timeout(self):
+        return self._setting("RESET_TIMEOUT", 30)
+
+    def state(self):
+        opened_at = self.cache.get(self._opened_key)
+        if opened_at is None:
+            return "closed"
+        if time.time() - opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self):
+        """Whether a call may go upstream now."""
+        state = self.state()
+        if state == "closed":
+            return True
+        # half-open: the first caller to claim the probe slot goes through
+        if state == "half_open" and self.cache.add(
+            self._probe_key, True, timeout=self.reset_timeout
+        ):
+            return True
+        metrics.breaker_rejections.inc(self.name)
+        return False
+
+    def record_success(self, elapsed):
+        """Record a completed call that took `elapsed` seconds."""
+        if elapsed > self.slow_call_seconds:
+            self.record_failure()
+            return
+        if self.cache.get(self._failures_key) or self.cache.get(self._opened_key):
+            self.cache.delete_many(
+                [self._failures_key, self._opened_key, self._probe_key]
+            )
+
+    def record_failure(self):
+        try:
+            failures = self.cache.incr(self._failures_key)
+        except ValueError:
+            self.cache.set(self._failures_key, 1, timeout=None)
+            failures = 1
+
+        if self.cache.get(self._opened_key) is not None:
+            # the half-open probe failed: stay open for another period
+            self._open()
+        elif failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.cache.set(self._opened_key, time.time(), timeout=None)
+        self.cache.delete(self._probe_key)
+
+    def stats(self):
+        return {
+            "state": self.state(),
+            "failures": self.cache.get(self._failures_key) or 0,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+        }
+
+
+osrm_breaker = CircuitBreaker("osrm")
@@ -0,0 +1,206 @@
+"""
+Local gazetteer geocoder: cities, ZIP centroids, truck terminals, ...
+loaded from a CSV or SQLite file and answered from memory.
+
+Entries are keyed by normalize_location(name), so "Dallas, Texas" and
+"dallas tx" find the same row. Lookups are a dict probe; autocomplete
+is a binary search over the sorted keys, with the best matches for
+short prefixes precomputed at load time.
+"""
+
+import csv
+import logging
+import sqlite3
+import threading
+from bisect import bisect_left
+from heapq import nlargest
+
+from django.conf import settings
+
+from .geocode_cache import US_STATES, normalize_location
+
+logger = logging.getLogger(__name__)
+
+STATE_CODES = frozenset(US_STATES.values())
+# Prefixes up to this length get their top matches precomputed
+PRECOMPUTED_PREFIX_LEN = 3
+MAX_SUGGESTIONS = 20
+
+
+class GazetteerEntry:
+    __slots__ = ("name", "key", "latitude", "longitude", "kind", "weight")
+
+    def __init__(self, name, latitude, longitude, kind="", weight=0.0):
+        self.name = name
+        self.key = normalize_location(name)
+        self.latitude = latitude
+        self.longitude = longitude
+        self.kind = kind
+        self.weight = weight
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "kind": self.kind,
+        }
+
+
+class Gazetteer:
+    """
+    In-memory index over GazetteerEntry rows. `weight` (e.g. population)
+    breaks ties: the heaviest entry wins an exact key, and suggestions
+    are ordered by it.
+    """
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda e: e.key)
+        self.keys = [entry.key for entry in self.entries]
+
+        self._exact = {}
+        for entry in self.entries:
+            self._claim(entry.key, entry)
+            # "dallas tx" also answers a bare "dallas"
+            city, _, state = entry.key.rpartition(" ")
+            if city and state in STATE_CODES:
+                self._claim(city, entry)
+
+        self._top = {}
+        for length in range(1, PRECOMPUTED_PREFIX_LEN + 1):
+            groups = {}
+            for index, key in enumerate(self.keys):
+                if len(key) >= length:
+                    groups.setdefault(key[:length], []).append(index)
+            for prefix, indexes in groups.items():
+                self._top[prefix] = self._best(indexes, MAX_SUGGESTIONS)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _claim(self, key, entry):
+        current = self._exact.get(key)
+        if current is None or entry.weight > current.weight:
+            self._exact[key] = entry
+
+    def _best(self, indexes, limit):
+        return nlargest(limit, indexes, key=lambda i: self.entries[i].weight)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, location):
+        """(lat, lon) for a free-text location, or None when not listed."""
+        entry = self._exact.get(normalize_location(location))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return (entry.latitude, entry.longitude) if entry is not None else None
+
+    def suggest(self, text, limit=10):
+        """Up to `limit` entries whose key starts with normalized `text`."""
+        prefix = normalize_location(text)
+        limit = min(limit, MAX_SUGGESTIONS)
+        if not prefix:
+            return []
+        if prefix in self._top:
+            indexes = self._top[prefix][:limit]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + "\uffff", lo)
+            indexes = self._best(range(lo, hi), limit)
+        return [self.entries[i] for i in indexes]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # Loading ---------------------------------------------------------------
+
+    @classmethod
+    def load(cls, path, table=None):
+        """
+        Load a CSV file (header: name,lat,lon[,kind][,weight]) or, for
+        .sqlite/.sqlite3/.db files, the same columns from `table`.
+        """
+        if str(path).endswith((".sqlite", ".sqlite3", ".db")):
+            rows = _sqlite_rows(path, table or "places")
+        else:
+            rows = _csv_rows(path)
+        return cls(
+            GazetteerEntry(
+                name,
+                float(lat),
+                float(lon),
+                kind or "",
+                float(weight or 0),
+            )
+            for name, lat, lon, kind, weight in rows
+        )
+
+
+def _csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield (
+                row["name"],
+                row["lat"],
+                row["lon"],
+                row.get("kind"),
+                row.get("weight"),
+            )
+
+
+def _sqlite_rows(path, table):
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        columns = {
+            row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')
+        }
+        kind = "kind" if "kind" in columns else "''"
+        weight = "weight" if "weight" in columns else "0"
+        yield from connection.execute(
+            f'SELECT name, lat, lon, {kind}, {weight} FROM "{table}"'
+        )
+    finally:
+        connection.close()
+
+
+_lock = threading.Lock()
+_gazetteer = None
+_gazetteer_path = None
+
+
+def get_gazetteer():
+    """
+    The gazetteer at GAZETTEER_PATH, loaded once per process; None when
+    none is configured or it cannot be loaded.
+    """
+    global _gazetteer, _gazetteer_path
+    path = getattr(settings, "GAZETTEER_PATH", None)
+    if not path:
+        return None
+    if _gazetteer_path != path:
+        with _lock:
+            if _gazetteer_path != path:
+                try:
+                    _gazetteer = Gazetteer.load(
+                        path, getattr(settings, "GAZETTEER_TABLE", "places")
+                    )
+                    logger.info(
+                        "Loaded gazetteer %s (%d entries)", path, len(_gazetteer)
+                    )
+                except (OSError, KeyError, ValueError, sqlite3.Error):
+                    logger.exception("Could not load gazetteer %s", path)
+                    _gazetteer = None
+                _gazetteer_path = path
+    return _gazetteer
@@ -0,0 +1,217 @@
+import logging
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import GeocodedLocation
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+US_STATES = {
+    "alabama": "al",
+    "alaska": "ak",
+    "arizona": "az",
+    "arkansas": "ar",
+    "california": "ca",
+    "colorado": "co",
+    "connecticut": "ct",
+    "delaware": "de",
+    "district of columbia": "dc",
+    "florida": "fl",
+    "georgia": "ga",
+    "hawaii": "hi",
+    "idaho": "id",
+    "illinois": "il",
+    "indiana": "in",
+    "iowa": "ia",
+    "kansas": "ks",
+    "kentucky": "ky",
+    "louisiana": "la",
+    "maine": "me",
+    "maryland": "md",
+    "massachusetts": "ma",
+    "michigan": "mi",
+    "minnesota": "mn",
+    "mississippi": "ms",
+    "missouri": "mo",
+    "montana": "mt",
+    "nebraska": "ne",
+    "nevada": "nv",
+    "new hampshire": "nh",
+    "new jersey": "nj",
+    "new mexico": "nm",
+    "new york": "ny",
+    "north carolina": "nc",
+    "north dakota": "nd",
+    "ohio": "oh",
+    "oklahoma": "ok",
+    "oregon": "or",
+    "pennsylvania": "pa",
+    "rhode island": "ri",
+    "south carolina": "sc",
+    "south dakota": "sd",
+    "tennessee": "tn",
+    "texas": "tx",
+    "utah": "ut",
+    "vermont": "vt",
+    "virginia": "va",
+    "washington": "wa",
+    "west virginia": "wv",
+    "wisconsin": "wi",
+    "wyoming": "wy",
+}
+
+# Common country suffixes that don't change the lookup for US locations
+COUNTRY_SUFFIXES = {"usa", "us", "united states", "united states of america"}
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+# Longest first so "west virginia" wins over "virginia"
+_COUNTRY_SUFFIXES = sorted(COUNTRY_SUFFIXES, key=len, reverse=True)
+_STATE_SUFFIXES = sorted(US_STATES, key=len, reverse=True)
+
+
+def _strip_suffix(text, suffixes):
+    for suffix in suffixes:
+        if text.endswith(" " + suffix):
+            return text[: -len(suffix) - 1], suffix
+    return text, None
+
+
+def normalize_location(location):
+    """
+    Build the cache key for a free-text location.
+
+    Lowercases, drops punctuation, collapses whitespace and rewrites a
+    trailing full state name to its postal code, so "Dallas, Texas",
+    "dallas tx" and "Dallas,  TX." all map to "dallas tx". A bare state
+    name ("New York") is left alone since it usually means the city.
+    """
+    text = _PUNCTUATION_RE.sub(" ", str(location).lower())
+    text = _WHITESPACE_RE.sub(" ", text).strip()
+
+    text, _ = _strip_suffix(text, _COUNTRY_SUFFIXES)
+    text, state = _strip_suffix(text, _STATE_SUFFIXES)
+    if state:
+        text = f"{text} {US_STATES[state]}"
+    return text
+
+
+class GeocodeCache:
+    """
+    Two-tier geocode cache: an in-process LRU in front of the
+    GeocodedLocation table. Both tiers honour the same TTL.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.ttl = (
+            ttl
+            if ttl is not None
+            else getattr(settings, "GEOCODE_CACHE_TTL", 60 * 60 * 24 * 30)
+        )
+        self.memory = LRUCache(
+            max_entries=max_entries
+            or getattr(settings, "GEOCODE_CACHE_MAX_ENTRIES", 2048),
+            ttl=self.ttl,
+        )
+        self._lock = threading.Lock()
+        self.db_hits = 0
+        self.db_misses = 0
+
+    def _expiry_cutoff(self):
+        return timezone.now() - timedelta(seconds=self.ttl)
+
+    def get(self, location):
+        key = normalize_location(location)
+        coords = self.memory.get(key)
+        if coords is not None:
+            return coords
+
+        # The table is only an optimisation: a locked or unavailable
+        # database degrades to a miss instead of failing the request.
+        try:
+            row = (
+                GeocodedLocation.objects.filter(normalized_query=key)
+                .values_list("id", "latitude", "longitude", "updated_at")
+                .first()
+            )
+            if row is not None and row[3] <= self._expiry_cutoff():
+                GeocodedLocation.objects.filter(id=row[0]).delete()
+                row = None
+            if row is not None:
+                GeocodedLocation.objects.filter(id=row[0]).update(hits=F("hits") + 1)
+        except DatabaseError as e:
+            logger.warning("Geocode cache read failed for %r: %s", key, e)
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.db_misses += 1
+            else:
+                self.db_hits += 1
+        if row is None:
+            return None
+
+        coords = (row[1], row[2])
+        self.memory.set(key, coords)
+        return coords
+
+    def set(self, location, coords):
+        key = normalize_location(location)
+        lat, lon = coords
+        try:
+            # Single upsert statement: no read-then-write transaction that
+            # SQLite would reject while the fan-out writes concurrently.
+            GeocodedLocation.objects.bulk_create(
+                [
+                    GeocodedLocation(
+                        normalized_query=key,
+                        query=str(location)[:255],
+                        latitude=lat,
+                        longitude=lon,
+                    )
+                ],
+                update_conflicts=True,
+                unique_fields=["normalized_query"],
+                update_fields=["latitude", "longitude", "updated_at"],
+            )
+        except DatabaseError as e:
+            logger.warning("Geocode cache write failed for %r: %s", key, e)
+        self.memory.set(key, (lat, lon))
+
+    def get_or_fetch(self, location, fetch):
+        coords = self.get(location)
+        if coords is None:
+            coords = fetch(location)
+            self.set(location, coords)
+        return coords
+
+    def purge_expired(self):
+        """Delete table rows older than the TTL; returns the number removed."""
+        deleted, _ = GeocodedLocation.objects.filter(
+            updated_at__lte=self._expiry_cutoff()
+        ).delete()
+        return deleted
+
+    def clear(self):
+        self.memory.clear()
+        GeocodedLocation.objects.all().delete()
+        with self._lock:
+            self.db_hits = 0
+            self.db_misses = 0
+
+    def stats(self):
+        with self._lock:
+            db = {"hits": self.db_hits, "misses": self.db_misses}
+        return {"memory": self.memory.stats(), "database": db, "ttl": self.ttl}
+
+
+geocode_cache = GeocodeCache()
@@ -0,0 +1,182 @@
+from math import cos, isfinite, radians
+
+# Web-mercator ground resolution at the equator, metres per pixel at zoom 0
+METERS_PER_PIXEL_Z0 = 156543.03392
+METERS_PER_DEGREE_LAT = 111320.0
+
+MAX_ZOOM = 22
+
+
+def encode_polyline(points, precision=5):
+    """
+    Encode [[lat, lon], ...] with Google's encoded polyline algorithm
+    (the format OSRM and Leaflet plugins use for polyline5/polyline6).
+    """
+    factor = 10**precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        ilat = int(round(lat * factor))
+        ilon = int(round(lon * factor))
+        _encode_value(ilat - prev_lat, out)
+        _encode_value(ilon - prev_lon, out)
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def _encode_value(value, out):
+    value = ~(value << 1) if value < 0 else (value << 1)
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def decode_polyline(encoded, precision=5):
+    factor = 10**precision
+    points = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append([lat / factor, lon / factor])
+    return points
+
+
+def zoom_tolerance(zoom, latitude=0.0, pixels=1.0):
+    """
+    Simplification tolerance (in degrees of latitude) that keeps the
+    simplified line within `pixels` screen pixels at a web-map zoom level.
+    """
+    meters_per_pixel = METERS_PER_PIXEL_Z0 * cos(radians(latitude)) / (2**zoom)
+    return pixels * meters_per_pixel / METERS_PER_DEGREE_LAT
+
+
+def simplify_path(points, tolerance):
+    """
+    Douglas-Peucker simplification of [[lat, lon], ...].
+
+    Distances are measured in degrees of latitude with longitude scaled
+    by cos(mean latitude). Iterative so 50k+ point paths can't hit the
+    recursion limit; endpoints are always kept.
+    """
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return [list(p) for p in points]
+
+    mean_lat = sum(p[0] for p in points) / n
+    kx = cos(radians(mean_lat))
+    xs = [p[1] * kx for p in points]
+    ys = [p[0] for p in points]
+    tol_sq = tolerance * tolerance
+
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        seg_sq = dx * dx + dy * dy
+
+        max_sq = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg_sq == 0:
+                d_sq = px * px + py * py
+            else:
+                t = (px * dx + py * dy) / seg_sq
+                if t < 0:
+                    t = 0.0
+                elif t > 1:
+                    t = 1.0
+                ex, ey = px - t * dx, py - t * dy
+                d_sq = ex * ex + ey * ey
+            if d_sq > max_sq:
+                max_sq = d_sq
+                index = i
+
+        if max_sq > tol_sq:
+            keep[index] = 1
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [list(points[i]) for i in range(n) if keep[i]]
+
+
+def parse_path_options(query_params):
+    """
+    Read ?path_format=array|polyline|polyline6 and one of
+    ?simplify=<degrees> or ?zoom=<level> from a request's query string.
+    Raises ValueError with a client-facing message on bad input.
+    """
+    options = {"format": "array", "precision": None, "tolerance": None, "zoom": None}
+
+    path_format = query_params.get("path_format", "array")
+    if path_format == "polyline":
+        options.update(format="polyline", precision=5)
+    elif path_format == "polyline6":
+        options.update(format="polyline", precision=6)
+    elif path_format != "array":
+        raise ValueError("path_format must be one of: array, polyline, polyline6.")
+
+    if "simplify" in query_params and "zoom" in query_params:
+        raise ValueError("Pass either simplify or zoom, not both.")
+
+    if "simplify" in query_params:
+        try:
+            options["tolerance"] = float(query_params["simplify"])
+        except ValueError:
+            raise ValueError("simplify must be a number (degrees).")
+        if not isfinite(options["tolerance"]):
+            raise ValueError("simplify must be a finite number (degrees).")
+        if options["tolerance"] < 0:
+            raise ValueError("simplify must not be negative.")
+
+    if "zoom" in query_params:
+        try:
+            options["zoom"] = int(query_params["zoom"])
+        except ValueError:
+            raise ValueError("zoom must be an integer.")
+        if not 0 <= options["zoom"] <= MAX_ZOOM:
+            raise ValueError(f"zoom must be between 0 and {MAX_ZOOM}.")
+
+    return options
+
+
+def apply_path_options(route_info, options):
+    """
+    Reshape route_info["path"] in place per parse_path_options(); the
+    default options leave the full [[lat, lon], ...] array untouched.
+    """
+    path = route_info.get("path") or []
+    tolerance = options.get("tolerance")
+    if options.get("zoom") is not None and path:
+        mean_lat = sum(p[0] for p in path) / len(path)
+        tolerance = zoom_tolerance(options["zoom"], mean_lat)
+
+    if tolerance:
+        path = simplify_path(path, tolerance)
+        route_info["path_simplified"] = True
+
+    if options.get("format") == "polyline":
+        route_info["path"] = encode_polyline(path, options["precision"])
+        route_info["path_format"] = f"polyline{options['precision']}"
+    else:
+        route_info["path"] = path
+    return route_info
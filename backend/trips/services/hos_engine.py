@@ -0,0 +1,378 @@
+"""
+Event-based HOS engine.
+
+Produces exactly the same daily_logs as hos_calculator.calculate_hos
+(same keys, same key order, same float values and int/float types), but:
+
+- activities are kept as immutable tuples and only turned into dicts
+  when the logs are materialized;
+- per-type day totals are accumulated as activities are emitted instead
+  of re-summing each day's activity list four times;
+- runs of "steady-state" days (full schedule, no fuel stop pending, no
+  cycle or trip limit reached) are not simulated block by block: their
+  count is computed in closed form and a shared day template is reused,
+  while the trip/cycle counters are advanced with the very same float
+  operations the block walk would perform, so results stay bit-identical.
+"""
+
+from math import floor
+
+from .hos_calculator import (
+    FIXED_DAILY_SCHEDULE,
+    FUEL_STOP_TIME,
+    MAX_CYCLE_HOURS,
+    MAX_DAILY_DRIVING_HOURS,
+    _duration,
+)
+
+MAX_DAYS = 60
+EPSILON = 1e-9
+# Safety margin for the steady-state test; days this close to a limit
+# are simulated block by block.
+STEADY_MARGIN = 1e-6
+
+DRIVING = "DRIVING"
+ON_DUTY = "ON_DUTY"
+OFF_DUTY = "OFF_DUTY"
+SLEEPER_BERTH = "SLEEPER_BERTH"
+
+POST_ARRIVAL = "Post-arrival On Duty"
+FUEL_STOP = "Fuel stop"
+
+# Marks an activity that has no "reason" key (distinct from reason=None)
+NO_REASON = object()
+
+
+class ScheduleBlock:
+    __slots__ = ("type", "start", "end", "length", "start_r", "end_r", "reason")
+
+    def __init__(self, typ, start, end, reason):
+        self.type = typ
+        self.start = start
+        self.end = end
+        self.length = _duration(start, end)
+        self.start_r = round(start, 4)
+        self.end_r = round(end, 4)
+        self.reason = reason
+
+
+SCHEDULE = tuple(ScheduleBlock(*block) for block in FIXED_DAILY_SCHEDULE)
+
+
+class DayRecord:
+    """
+    One simulated day. `activities` is a tuple of
+    (type, start, end, duration, reason) tuples; hour totals are the raw
+    (unrounded) sums, exactly as calculate_hos computes them.
+    """
+
+    __slots__ = (
+        "day",
+        "activities",
+        "driving_hours",
+        "on_duty_hours",
+        "off_duty_hours",
+        "sleeper_hours",
+        "total_hours",
+        "miles_driven",
+    )
+
+    def __init__(self, day, activities, totals, avg_speed_mph):
+        driving, on_duty, off_duty, sleeper = totals
+        self.day = day
+        self.activities = activities
+        self.driving_hours = driving
+        self.on_duty_hours = on_duty
+        self.off_duty_hours = off_duty
+        self.sleeper_hours = sleeper
+        self.total_hours = round(driving + on_duty + off_duty + sleeper, 4)
+        self.miles_driven = (
+            round(driving * avg_speed_mph, 2) if avg_speed_mph > 0 else 0.0
+        )
+
+    def as_log(self):
+        """Materialize the calculate_hos day dict."""
+        activities = []
+        for typ, start, end, duration, reason in self.activities:
+            act = {"type": typ, "start": start, "end": end, "duration": duration}
+            if reason is not NO_REASON:
+                act["reason"] = reason
+            activities.append(act)
+        return {
+            "day": self.day,
+            "activities": activities,
+            "driving_hours": round(self.driving_hours, 4),
+            "on_duty_hours": round(self.on_duty_hours, 4),
+            "off_duty_hours": round(self.off_duty_hours, 4),
+            "sleeper_hours": round(self.sleeper_hours, 4),
+            "total_hours": self.total_hours,
+            "miles_driven": self.miles_driven,
+        }
+
+
+class HOSState:
+    """Counters carried from one day to the next."""
+
+    __slots__ = ("remaining_trip_hours", "remaining_cycle_hours", "fuel_stop_used")
+
+    def __init__(self, remaining_trip_hours, remaining_cycle_hours, fuel_stop_used):
+        self.remaining_trip_hours = remaining_trip_hours
+        self.remaining_cycle_hours = remaining_cycle_hours
+        self.fuel_stop_used = fuel_stop_used
+
+
+def _simulate_day(state, fuel_stops):
+    """
+    Walk the fixed schedule for one day, mutating `state`.
+    Returns (activities, totals, stop_after_this_day).
+    """
+    rt = state.remaining_trip_hours
+    rc = state.remaining_cycle_hours
+    fuel_stop_used = state.fuel_stop_used
+    stop = False
+
+    acts = []
+    append = acts.append
+    # Per-type totals, accumulated in emission order; int 0 start value
+    # matches sum() so "no activity of this type" stays an int.
+    driving = on_duty = off_duty = sleeper = 0
+
+    for block in SCHEDULE:
+        typ = block.type
+        bl = block.length
+
+        if rc <= 0:
+            dur = round(bl, 4)
+            append((OFF_DUTY, block.start_r, block.end_r, dur, NO_REASON))
+            off_duty += dur
+            stop = True
+            continue
+
+        if typ == DRIVING:
+            if rt > EPSILON:
+                allowed_drive = min(bl, rt, rc, MAX_DAILY_DRIVING_HOURS)
+                end_actual = block.start + allowed_drive
+                dur = round(allowed_drive, 4)
+                append((DRIVING, block.start_r, round(end_actual, 4), dur, NO_REASON))
+                driving += dur
+                rt -= allowed_drive
+                rc -= allowed_drive
+
+                remainder = round(bl - allowed_drive, 4)
+                if remainder > EPSILON:
+                    seg_start = round(end_actual, 4)
+                    seg_end = round(end_actual + remainder, 4)
+                    if rt <= EPSILON and rc > 0:
+                        append((ON_DUTY, seg_start, seg_end, remainder, POST_ARRIVAL))
+                        on_duty += remainder
+                        rc = max(0.0, rc - remainder)
+                    else:
+                        append((OFF_DUTY, seg_start, seg_end, remainder, NO_REASON))
+                        off_duty += remainder
+                        if rc <= 0:
+                            stop = True
+
+                if fuel_stops and not fuel_stop_used and allowed_drive > 0 and rc > 0:
+                    fs_start = round(end_actual + 0.0, 4)
+                    fs_end = round(fs_start + FUEL_STOP_TIME, 4)
+                    dur = round(FUEL_STOP_TIME, 4)
+                    append((ON_DUTY, fs_start, fs_end, dur, FUEL_STOP))
+                    on_duty += dur
+                    rc = max(0.0, rc - FUEL_STOP_TIME)
+                    fuel_stop_used = True
+            else:
+                # rc > 0 here: the rc <= 0 case was handled above
+                append((ON_DUTY, block.start_r, block.end_r, bl, POST_ARRIVAL))
+                on_duty += bl
+                rc = max(0.0, rc - bl)
+
+        elif typ == ON_DUTY:
+            append((ON_DUTY, block.start_r, block.end_r, bl, block.reason))
+            on_duty += bl
+            rc = max(0.0, rc - bl)
+
+        elif typ == SLEEPER_BERTH:
+            append((SLEEPER_BERTH, block.start_r, block.end_r, bl, NO_REASON))
+            sleeper += bl
+
+        else:  # OFF_DUTY
+            append((OFF_DUTY, block.start_r, block.end_r, bl, NO_REASON))
+            off_duty += bl
+
+    state.remaining_trip_hours = rt
+    state.remaining_cycle_hours = rc
+    state.fuel_stop_used = fuel_stop_used
+    return tuple(acts), (driving, on_duty, off_duty, sleeper), stop
+
+
+def _steady_day_template():
+    # A day run with effectively unlimited trip and cycle hours is the
+    # full schedule: every block kept, every driving block driven in full.
+    state = HOSState(1e12, 1e12, True)
+    activities, totals, _ = _simulate_day(state, fuel_stops=False)
+    return activities, totals
+
+
+STEADY_ACTIVITIES, STEADY_TOTALS = _steady_day_template()
+# Trip and cycle hours one steady day consumes
+STEADY_DRIVE = sum(b.length for b in SCHEDULE if b.type == DRIVING)
+STEADY_CYCLE = STEADY_DRIVE + sum(b.length for b in SCHEDULE if b.type == ON_DUTY)
+
+
+def _steady_days(state, fuel_stops, days_left):
+    """
+    How many upcoming days are guaranteed to be steady-state, in closed
+    form from the current counters.
+    """
+    if fuel_stops and not state.fuel_stop_used:
+        return 0
+    rt = state.remaining_trip_hours - STEADY_DRIVE - STEADY_MARGIN
+    rc = state.remaining_cycle_hours - STEADY_CYCLE - STEADY_MARGIN
+    if rt < 0 or rc < 0:
+        return 0
+    return min(
+        floor(rt / STEADY_DRIVE) + 1,
+        floor(rc / STEADY_CYCLE) + 1,
+        days_left,
+    )
+
+
+def _advance_steady_day(state):
+    # Same float operations, in the same order, as _simulate_day on a
+    # steady day - keeps the counters bit-identical without the walk.
+    rt = state.remaining_trip_hours
+    rc = state.remaining_cycle_hours
+    for block in SCHEDULE:
+        if block.type == DRIVING:
+            rt -= block.length
+            rc -= block.length
+        elif block.type == ON_DUTY:
+            rc = max(0.0, rc - block.length)
+    state.remaining_trip_hours = rt
+    state.remaining_cycle_hours = rc
+
+
+def average_speed(total_trip_hours, total_distance_miles):
+    # defensive average speed, as in calculate_hos
+    return (
+        (total_distance_miles / total_trip_hours)
+        if (total_trip_hours and total_distance_miles)
+        else 55.0
+    )
+
+
+def simulate_hos(
+    total_trip_hours,
+    total_distance_miles,
+    current_cycle_used_hours,
+    fuel_stops,
+    checkpoints=None,
+):
+    """
+    Run the engine and return a list of DayRecord. If `checkpoints` is a
+    list, the state at the start of every day is appended to it (see
+    make_checkpoint), so checkpoints[n - 1] resumes day n.
+    """
+    state = HOSState(
+        float(total_trip_hours),
+        float(MAX_CYCLE_HOURS - float(current_cycle_used_hours)),
+        False,
+    )
+    avg_speed_mph = average_speed(total_trip_hours, total_distance_miles)
+    return _run(state, 1, fuel_stops, avg_speed_mph, checkpoints)
+
+
+def make_checkpoint(state, day, fuel_stops, avg_speed_mph):
+    """
+    JSON-serializable engine state at the start of `day`: everything
+    resume_hos needs to carry on from that day boundary.
+    """
+    return {
+        "day": day,
+        "remaining_trip_hours": state.remaining_trip_hours,
+        "remaining_cycle_hours": state.remaining_cycle_hours,
+        "fuel_stop_used": state.fuel_stop_used,
+        "fuel_stops": bool(fuel_stops),
+        "avg_speed_mph": avg_speed_mph,
+    }
+
+
+def resume_hos(checkpoint, remaining_trip_hours=None, checkpoints=None):
+    """
+    Continue a run from a make_checkpoint() dict and return the
+    DayRecords from checkpoint["day"] on; only those days are simulated.
+    `remaining_trip_hours` replaces the checkpoint's value (after a
+    detour, a delay or a new route duration). Raises ValueError on a
+    malformed checkpoint.
+    """
+    try:
+        day = int(checkpoint["day"])
+        state = HOSState(
+            float(
+                checkpoint["remaining_trip_hours"]
+                if remaining_trip_hours is None
+                else remaining_trip_hours
+            ),
+            float(checkpoint["remaining_cycle_hours"]),
+            bool(checkpoint["fuel_stop_used"]),
+        )
+        fuel_stops = bool(checkpoint["fuel_stops"])
+        avg_speed_mph = float(checkpoint["avg_speed_mph"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Malformed HOS checkpoint.")
+    if not 1 <= day <= MAX_DAYS:
+        raise ValueError(f"Checkpoint day must be between 1 and {MAX_DAYS}.")
+    return _run(state, day, fuel_stops, avg_speed_mph, checkpoints)
+
+
+def _run(state, day, fuel_stops, avg_speed_mph, checkpoints=None):
+    days = []
+    while day <= MAX_DAYS:
+        steady = _steady_days(state, fuel_stops, MAX_DAYS - day + 1)
+        if steady:
+            for _ in range(steady):
+                if checkpoints is not None:
+                    checkpoints.append(
+                        make_checkpoint(state, day, fuel_stops, avg_speed_mph)
+                    )
+                _advance_steady_day(state)
+                days.append(
+                    DayRecord(day, STEADY_ACTIVITIES, STEADY_TOTALS, avg_speed_mph)
+                )
+                day += 1
+            continue
+
+        if checkpoints is not None:
+            checkpoints.append(make_checkpoint(state, day, fuel_stops, avg_speed_mph))
+        activities, totals, stop = _simulate_day(state, fuel_stops)
+        days.append(DayRecord(day, activities, totals, avg_speed_mph))
+
+        if stop:
+            break
+        if state.remaining_trip_hours <= EPSILON:
+            break
+        day += 1
+
+    return days
+
+
+def calculate_hos_fast(
+    total_trip_hours,
+    total_distance_miles,
+    current_cycle_used_hours,
+    fuel_stops,
+    use_fixed_schedule=True,
+    checkpoints=None,
+):
+    """
+    Drop-in replacement for hos_calculator.calculate_hos; optionally
+    collects per-day resume checkpoints (see simulate_hos).
+    """
+    days = simulate_hos(
+        total_trip_hours,
+        total_distance_miles,
+        current_cycle_used_hours,
+        fuel_stops,
+        checkpoints=checkpoints,
+    )
+    return [record.as_log() for record in days]
@@ -0,0 +1,62 @@
+"""
+Alternative encodings of hos_logs for API responses (?hos_format=).
+
+"columnar" turns each day's list of activity dicts into parallel arrays,
+with the duty status dictionary-encoded:
+
+    {"types": ["OFF_DUTY", "SLEEPER_BERTH", "DRIVING", "ON_DUTY"],
+     "type": [3, 2, ...], "start": [...], "end": [...],
+     "duration": [...], "reason": [...]}
+
+`reason` is null where an activity has none. Stored plans always keep
+the default list-of-dicts form.
+"""
+
+HOS_FORMATS = ("default", "columnar")
+
+# Dictionary order is fixed (the ELD grid rows) so codes are stable
+ACTIVITY_TYPES = ("OFF_DUTY", "SLEEPER_BERTH", "DRIVING", "ON_DUTY")
+
+
+def parse_hos_format(query_params):
+    """
+    Read ?hos_format=default|columnar. Raises ValueError with a
+    client-facing message on bad input.
+    """
+    hos_format = query_params.get("hos_format", "default")
+    if hos_format not in HOS_FORMATS:
+        raise ValueError(f"hos_format must be one of: {', '.join(HOS_FORMATS)}.")
+    return hos_format
+
+
+def columnar_activities(activities):
+    types = list(ACTIVITY_TYPES)
+    codes = {typ: code for code, typ in enumerate(types)}
+    type_column = []
+    for act in activities:
+        code = codes.get(act["type"])
+        if code is None:
+            code = codes[act["type"]] = len(types)
+            types.append(act["type"])
+        type_column.append(code)
+    return {
+        "types": types,
+        "type": type_column,
+        "start": [act.get("start") for act in activities],
+        "end": [act.get("end") for act in activities],
+        "duration": [act.get("duration") for act in activities],
+        "reason": [act.get("reason") for act in activities],
+    }
+
+
+def format_hos_log(log, hos_format):
+    """A day log in `hos_format`; `log` itself is not modified."""
+    if hos_format != "columnar":
+        return log
+    return {**log, "activities": columnar_activities(log["activities"])}
+
+
+def apply_hos_format(hos_logs, hos_format):
+    """Re-encode a list of day logs in place per parse_hos_format()."""
+    hos_logs[:] = [format_hos_log(log, hos_format) for log in hos_logs]
+    return hos_logs
@@ -0,0 +1,119 @@
+from django.conf import settings
+
+from .hos_engine import simulate_hos
+from .lru import LRUCache
+
+
+class HOSMemo:
+    """
+    Bounded, thread-safe memo in front of the event HOS engine.
+
+    The HOS logs are a pure function of trip hours, distance, cycle hours
+    used and whether there is a fuel stop. Keys are those inputs rounded
+    to HOS_MEMO_PRECISION decimal places (OSRM durations and distances
+    already come rounded to 0.01) and the engine runs on the rounded
+    values, so every input in a key's bucket gets the same logs.
+
+    Entries keep the engine's compact DayRecords and checkpoint tuples;
+    each call materializes fresh log dicts, so callers may mutate what
+    they get back without touching the memo.
+    """
+
+    def __init__(self, max_entries=None, precision=None):
+        if max_entries is None:
+            max_entries = getattr(settings, "HOS_MEMO_MAX_ENTRIES", 2048)
+        self.precision = (
+            precision
+            if precision is not None
+            else getattr(settings, "HOS_MEMO_PRECISION", 2)
+        )
+        self._cache = LRUCache(max_entries=max_entries)
+
+    def key(
+        self,
+        total_trip_hours,
+        total_distance_miles,
+        current_cycle_used_hours,
+        fuel_stops,
+    ):
+        p = self.precision
+        return (
+            round(float(total_trip_hours), p),
+            round(float(total_distance_miles), p),
+            round(float(current_cycle_used_hours), p),
+            bool(fuel_stops),
+        )
+
+    def calculate_hos(
+        self,
+        total_trip_hours,
+        total_distance_miles,
+        current_cycle_used_hours,
+        fuel_stops,
+        use_fixed_schedule=True,
+        checkpoints=None,
+    ):
+        """Same signature and output as hos_engine.calculate_hos_fast."""
+        key = self.key(
+            total_trip_hours,
+            total_distance_miles,
+            current_cycle_used_hours,
+            fuel_stops,
+        )
+        entry = self._cache.get(key)
+        if entry is None:
+            day_checkpoints = []
+            records = tuple(simulate_hos(*key, checkpoints=day_checkpoints))
+            entry = (records, _pack_checkpoints(day_checkpoints))
+            self._cache.set(key, entry)
+
+        records, packed = entry
+        if checkpoints is not None:
+            checkpoints.extend(_unpack_checkpoints(packed))
+        return [record.as_log() for record in records]
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return {"precision": self.precision, **self._cache.stats()}
+
+
+def _pack_checkpoints(checkpoints):
+    # fuel_stops and avg_speed_mph are the same for every day of a run
+    if not checkpoints:
+        return None
+    first = checkpoints[0]
+    return (
+        first["fuel_stops"],
+        first["avg_speed_mph"],
+        tuple(
+            (
+                c["day"],
+                c["remaining_trip_hours"],
+                c["remaining_cycle_hours"],
+                c["fuel_stop_used"],
+            )
+            for c in checkpoints
+        ),
+    )
+
+
+def _unpack_checkpoints(packed):
+    if packed is None:
+        return []
+    fuel_stops, avg_speed_mph, days = packed
+    return [
+        {
+            "day": day,
+            "remaining_trip_hours": remaining_trip_hours,
+            "remaining_cycle_hours": remaining_cycle_hours,
+            "fuel_stop_used": fuel_stop_used,
+            "fuel_stops": fuel_stops,
+            "avg_speed_mph": avg_speed_mph,
+        }
+        for day, remaining_trip_hours, remaining_cycle_hours, fuel_stop_used in days
+    ]
+
+
+hos_memo = HOSMemo()
@@ -0,0 +1,90 @@
+import numpy as np
+
+from .hos_calculator import FUEL_STOP_TIME, MAX_CYCLE_HOURS, MAX_DAILY_DRIVING_HOURS
+from .hos_engine import DRIVING, EPSILON, MAX_DAYS, ON_DUTY, SCHEDULE
+
+FUEL_STOP_EVERY_MILES = 1000
+
+
+def sweep_hos(cycle_used_hours, trip_hours, avg_speed_mph=55.0, fuel_stops=None):
+    """
+    Evaluate the fixed-schedule HOS rules for every combination of
+    `cycle_used_hours` (rows) and `trip_hours` (columns) at once.
+
+    The whole grid is stepped through the schedule together with NumPy
+    masks, so it costs one pass over at most 60 days instead of one
+    calculate_hos call per cell. Only the summary is kept:
+
+    - days_needed: number of day logs calculate_hos would produce
+    - arrival_day: day the trip's driving completes (0 = never)
+    - cycle_exhausted: the 70-hour cycle runs out before arrival
+
+    `fuel_stops` forces the fuel-stop rule on/off for every column; by
+    default a column gets one when trip_hours * avg_speed_mph exceeds
+    1000 miles, as calculate_fuel_stops would emit.
+    """
+    cycle_used = np.asarray(cycle_used_hours, dtype=np.float64).reshape(-1, 1)
+    trips = np.asarray(trip_hours, dtype=np.float64).reshape(1, -1)
+    shape = (cycle_used.shape[0], trips.shape[1])
+
+    rt = np.broadcast_to(trips, shape).copy()
+    rc = np.broadcast_to(MAX_CYCLE_HOURS - cycle_used, shape).copy()
+    if fuel_stops is None:
+        needs_fuel = np.broadcast_to(
+            trips * avg_speed_mph > FUEL_STOP_EVERY_MILES, shape
+        )
+    else:
+        needs_fuel = np.full(shape, bool(fuel_stops))
+    fuel_used = np.zeros(shape, dtype=bool)
+
+    active = np.ones(shape, dtype=bool)
+    days = np.zeros(shape, dtype=np.int16)
+    arrival = np.zeros(shape, dtype=np.int16)
+
+    for day in range(1, MAX_DAYS + 1):
+        stop = np.zeros(shape, dtype=bool)
+
+        for block in SCHEDULE:
+            bl = block.length
+            exhausted = active & (rc <= 0)
+            stop |= exhausted
+            live = active & ~exhausted
+
+            if block.type == DRIVING:
+                drive = live & (rt > EPSILON)
+                allowed = np.minimum(
+                    np.minimum(rt, rc), min(bl, MAX_DAILY_DRIVING_HOURS)
+                )
+                allowed = np.where(drive, allowed, 0.0)
+                rt -= allowed
+                rc -= allowed
+
+                remainder = np.round(bl - allowed, 4)
+                has_rem = drive & (remainder > EPSILON)
+                post_arrival = has_rem & (rt <= EPSILON) & (rc > 0)
+                rc = np.where(post_arrival, np.maximum(0.0, rc - remainder), rc)
+                stop |= has_rem & ~post_arrival & (rc <= 0)
+
+                fuel = drive & needs_fuel & ~fuel_used & (allowed > 0) & (rc > 0)
+                rc = np.where(fuel, np.maximum(0.0, rc - FUEL_STOP_TIME), rc)
+                fuel_used |= fuel
+
+                # no driving left: block becomes post-arrival on duty
+                idle = live & ~drive
+                rc = np.where(idle, np.maximum(0.0, rc - bl), rc)
+
+            elif block.type == ON_DUTY:
+                rc = np.where(live, np.maximum(0.0, rc - bl), rc)
+
+        days[active] = day
+        arrived = active & (rt <= EPSILON) & (arrival == 0)
+        arrival[arrived] = day
+        active &= ~stop & (rt > EPSILON)
+        if not active.any():
+            break
+
+    return {
+        "days_needed": days,
+        "arrival_day": arrival,
+        "cycle_exhausted": arrival == 0,
+    }
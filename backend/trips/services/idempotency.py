@@ -0,0 +1,202 @@
+"""
+Request de-duplication for the create endpoint.
+
+A request is identified by its Idempotency-Key header or, without one,
+by a fingerprint of its method, path, query string and JSON body, both
+namespaced by the client (the authenticated user, else the address DRF
+throttling would use, see REST_FRAMEWORK["NUM_PROXIES"]). So a
+double-click is caught too, and one client can never replay another's
+response. The first response (anything but a 5xx) is recorded in the
+IdempotencyRecord table and replayed for duplicates: for
+IDEMPOTENCY_KEY_TTL seconds with a key, IDEMPOTENCY_FINGERPRINT_TTL
+seconds without one. A response for a created trip is recorded as just
+the trip and rebuilt from its stored plan on replay; others are small
+and kept as they are.
+
+Identical requests that arrive while the first is still running wait
+for it instead of computing again: in-process through a shared Future,
+across workers through the record's unique key, which is inserted
+before the trip is created and so acts as an atomic lock.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from ..models import IdempotencyRecord
+
+POLL_INTERVAL = 0.1  # seconds between checks for another worker's result
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused with a different request body."""
+
+
+def fingerprint(request):
+    """sha256 over method, path, query string and the canonical JSON body."""
+    body = json.dumps(request.data, sort_keys=True, separators=(",", ":"))
+    raw = "\n".join(
+        (request.method, request.path, request.META.get("QUERY_STRING", ""), body)
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def client_identity(request):
+    """The authenticated user, else the client address behind trusted proxies."""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return "addr:" + BaseThrottle().get_ident(request)
+
+
+class IdempotencyStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.replays = 0
+        self.coalesced = 0
+
+    def run(self, request, compute, replay):
+        """
+        (status, data, replayed) for `request`: the stored response of an
+        earlier identical request if there is one, else compute()'s
+        (status, data). compute() returns (status, data, trip), where trip
+        is the created Trip whose response replay(trip_id) can rebuild,
+        or None to store data itself. Raises IdempotencyConflict when the
+        request's Idempotency-Key was first used with another body.
+        """
+        body_hash = fingerprint(request)
+        client = client_identity(request)
+        key = request.headers.get("Idempotency-Key")
+        if key:
+            raw = f"key:{client}:{key}"
+            ttl = getattr(settings, "IDEMPOTENCY_KEY_TTL", 60 * 60 * 24)
+        else:
+            raw = f"body:{client}:{body_hash}"
+            ttl = getattr(settings, "IDEMPOTENCY_FINGERPRINT_TTL", 10)
+        record_key = hashlib.sha256(raw.encode()).hexdigest()
+
+        stored = self._stored(record_key, body_hash, replay)
+        if stored is not None:
+            return stored
+
+        with self._lock:
+            future = self._inflight.get(record_key)
+            owner = future is None
+            if owner:
+                future = self._inflight[record_key] = Future()
+        if not owner:
+            with self._lock:
+                self.coalesced += 1
+            status, data, _ = future.result()
+            self._check_body(future.body_hash, body_hash)
+            return status, data, True
+
+        future.body_hash = body_hash
+        try:
+            result = self._run_once(record_key, body_hash, ttl, compute, replay)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[record_key]
+
+    def _run_once(self, record_key, body_hash, ttl, compute, replay):
+        lock_timeout = getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 60)
+        deadline = time.monotonic() + lock_timeout
+        record = self._claim(record_key, body_hash, lock_timeout)
+        # another worker holds the key: wait for its result or the lock
+        while record is None:
+            stored = self._stored(record_key, body_hash, replay)
+            if stored is not None:
+                with self._lock:
+                    self.coalesced += 1
+                return stored
+            if time.monotonic() > deadline:
+                break
+            time.sleep(POLL_INTERVAL)
+            record = self._claim(record_key, body_hash, lock_timeout)
+
+        try:
+            status, data, trip = compute()
+        except BaseException:
+            if record is not None:
+                record.delete()
+            raise
+        if record is not None:
+            if status < 500:
+                # filtered on pk: a no-op if the lock expired and was taken over
+                IdempotencyRecord.objects.filter(pk=record.pk).update(
+                    status=status,
+                    trip=trip,
+                    response=data if trip is None else None,
+                    expires_at=timezone.now() + timedelta(seconds=ttl),
+                )
+            else:
+                record.delete()
+        return status, data, False
+
+    def _claim(self, record_key, body_hash, lock_timeout):
+        """
+        Insert the running record for `record_key`; None if another
+        request holds it or already stored a response.
+        """
+        now = timezone.now()
+        # expired responses, and locks whose holder died or gave up
+        IdempotencyRecord.objects.filter(expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                return IdempotencyRecord.objects.create(
+                    key=record_key,
+                    body_hash=body_hash,
+                    expires_at=now + timedelta(seconds=lock_timeout),
+                )
+        except IntegrityError:
+            return None
+
+    def _stored(self, record_key, body_hash, replay):
+        entry = (
+            IdempotencyRecord.objects.filter(
+                key=record_key, status__isnull=False, expires_at__gt=timezone.now()
+            )
+            .values_list("body_hash", "status", "trip_id", "response")
+            .first()
+        )
+        if entry is None:
+            return None
+        stored_hash, status, trip_id, data = entry
+        self._check_body(stored_hash, body_hash)
+        if trip_id is not None:
+            data = replay(trip_id)
+        with self._lock:
+            self.replays += 1
+        return status, data, True
+
+    def _check_body(self, stored_hash, body_hash):
+        if stored_hash != body_hash:
+            raise IdempotencyConflict(
+                "Idempotency-Key was already used with a different request."
+            )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "inflight": len(self._inflight),
+                "replays": self.replays,
+                "coalesced": self.coalesced,
+            }
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,140 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import TripJob, TripPlan
+from .planner import plan_trip
+from .pool import get_executor
+
+logger = logging.getLogger(__name__)
+
+# Stage -> progress percentage reported while that stage runs
+STAGE_PROGRESS = {
+    TripJob.QUEUED: 0,
+    "geocode": 10,
+    "route": 35,
+    "hos": 70,
+    "enrich": 85,
+    "done": 100,
+}
+
+
+def submit_trip_job(trip):
+    """
+    Queue background planning for a saved Trip on the in-process "jobs"
+    pool and return its TripJob. The job starts once the surrounding
+    transaction (if any) commits.
+    """
+    job = TripJob.objects.create(trip=trip)
+    transaction.on_commit(lambda: get_executor("jobs").submit(run_trip_job, job.pk))
+    return job
+
+
+def _update(job_id, **fields):
+    # update() rather than save(): cheap, and never clobbers other fields
+    TripJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **fields)
+
+
+def run_trip_job(job_id):
+    job = TripJob.objects.select_related("trip").get(pk=job_id)
+    _update(job_id, status=TripJob.RUNNING)
+
+    def progress(stage):
+        _update(job_id, stage=stage, progress=STAGE_PROGRESS.get(stage, 0))
+
+    try:
+        checkpoints = []
+        plan = plan_trip(job.trip, progress=progress, checkpoints=checkpoints)
+        TripPlan.from_plan(job.trip, plan, checkpoints).save()
+    except Exception as e:
+        logger.exception("Trip job %s failed", job_id)
+        _update(job_id, status=TripJob.FAILED, error=str(e) or e.__class__.__name__)
+        return
+
+    _update(
+        job_id,
+        status=TripJob.SUCCEEDED,
+        stage="done",
+        progress=STAGE_PROGRESS["done"],
+    )
+
+
+def fail_if_stale(job):
+    """
+    Mark a queued or running job failed once it has gone
+    TRIP_JOB_STALE_SECONDS without an update: jobs run on an in-process
+    pool, so a worker that crashed or restarted took the job with it.
+    Returns `job`, updated to match its row.
+    """
+    stale_seconds = getattr(settings, "TRIP_JOB_STALE_SECONDS", 300)
+    cutoff = timezone.now() - timedelta(seconds=stale_seconds)
+    if job.finished or job.updated_at >= cutoff:
+        return job
+    error = "The job was interrupted before it finished; please retry."
+    # conditional, so a worker that has just reported progress wins
+    if TripJob.objects.filter(
+        pk=job.pk,
+        status__in=[TripJob.QUEUED, TripJob.RUNNING],
+        updated_at__lt=cutoff,
+    ).update(status=TripJob.FAILED, error=error, updated_at=timezone.now()):
+        logger.warning("Trip job %s went stale, marked failed", job.pk)
+    job.refresh_from_db(fields=["status", "stage", "progress", "error", "updated_at"])
+    return job
+
+
+def job_status(job):
+    return {
+        "job_id": str(job.pk),
+        "trip_id": job.trip_id,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "error": job.error or None,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat(),
+    }
+
+
+def iter_job_events(job_id):
+    """
+    Yield (event, job) pairs for a job's progress stream: "progress" on
+    every status/stage change, then "done" or "error" once it finishes,
+    or "timeout" after JOB_EVENTS_MAX_SECONDS. Polls the TripJob row, so
+    it works from any worker; yields ("keep-alive", None) while idle. A
+    job whose worker died ends with "error" (see fail_if_stale()).
+    """
+    poll_interval = getattr(settings, "JOB_EVENTS_POLL_INTERVAL", 0.5)
+    deadline = time.monotonic() + getattr(settings, "JOB_EVENTS_MAX_SECONDS", 120)
+    keep_alive_every = 15.0
+    last_state = None
+    last_sent = time.monotonic()
+
+    while True:
+        job = TripJob.objects.filter(pk=job_id).first()
+        if job is None:
+            return
+
+        job = fail_if_stale(job)
+        if job.finished:
+            yield ("done" if job.status == TripJob.SUCCEEDED else "error"), job
+            return
+
+        state = (job.status, job.stage)
+        if state != last_state:
+            last_state = state
+            last_sent = time.monotonic()
+            yield "progress", job
+
+        now = time.monotonic()
+        if now >= deadline:
+            yield "timeout", job
+            return
+        if now - last_sent >= keep_alive_every:
+            last_sent = now
+            yield "keep-alive", None
+
+        time.sleep(poll_interval)
@@ -0,0 +1,102 @@
+"""
+Multi-stop trips: a pairwise distance/duration matrix between the
+geocoded stops and the stop order that minimizes total drive time.
+
+Legs come from the leg cache, then the OSRM table service for whatever
+is missing, then the haversine estimate when OSRM is unavailable. Only
+OSRM legs are cached, as with routes, so re-ordering the same stops
+never calls OSRM again.
+"""
+
+import logging
+
+from .route_cache import leg_cache
+from .routing import haversine_miles, osrm_table
+
+FALLBACK_SPEED_MPH = 55.0  # as routing._straight_line_route
+
+logger = logging.getLogger(__name__)
+
+
+def distance_matrix(points):
+    """(distances_miles, durations_hours) n x n matrices between `points`."""
+    n = len(points)
+    pairs = [(points[i], points[j]) for i in range(n) for j in range(n) if i != j]
+    legs = leg_cache.get_many(pairs)
+
+    if len(legs) < len(pairs):
+        try:
+            distances, durations = osrm_table(points)
+        except Exception:
+            logger.warning("OSRM table failed, estimating legs", exc_info=True)
+        else:
+            fetched = {}
+            for i in range(n):
+                for j in range(n):
+                    if i != j and durations[i][j] is not None:
+                        fetched[points[i], points[j]] = (
+                            round(distances[i][j], 2),
+                            round(durations[i][j], 4),
+                        )
+            leg_cache.set_many(fetched)
+            legs.update(fetched)
+
+    distances = [[0.0] * n for _ in range(n)]
+    durations = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            if i == j:
+                continue
+            leg = legs.get((points[i], points[j]))
+            if leg is None:
+                miles = haversine_miles(*points[i], *points[j])
+                leg = (miles, miles / FALLBACK_SPEED_MPH)
+            distances[i][j], durations[i][j] = leg
+    return distances, durations
+
+
+def path_cost(order, cost):
+    return sum(cost[a][b] for a, b in zip(order, order[1:]))
+
+
+def order_stops(cost, fixed=1):
+    """
+    Visiting order (indices into `cost`) for an open path that starts
+    with the first `fixed` indices as given and ends at the last index;
+    the stops in between are ordered by nearest neighbour, then improved
+    with 2-opt until no segment reversal shortens the path. `cost` may
+    be asymmetric.
+    """
+    n = len(cost)
+    order = list(range(fixed))
+    remaining = set(range(fixed, n - 1))
+    while remaining:
+        here = order[-1]
+        nearest = min(remaining, key=lambda j: (cost[here][j], j))
+        order.append(nearest)
+        remaining.remove(nearest)
+    order.append(n - 1)
+
+    best = path_cost(order, cost)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(fixed, n - 2):
+            for k in range(i + 1, n - 1):
+                candidate = order[:i] + order[i : k + 1][::-1] + order[k + 1 :]
+                candidate_cost = path_cost(candidate, cost)
+                if candidate_cost < best - 1e-9:
+                    order, best = candidate, candidate_cost
+                    improved = True
+    return order
+
+
+def optimize_stop_order(points, fixed=1):
+    """
+    Order for visiting `points`: the first `fixed` and the last stay in
+    place, the rest are reordered to minimize total drive time.
+    """
+    if len(points) - fixed < 3:
+        return list(range(len(points)))
+    _, durations = distance_matrix(points)
+    return order_stops(durations, fixed)
@@ -0,0 +1,200 @@
+"""
+Stage timing spans and process-wide metrics.
+
+`span("route")` times a block. The duration goes into the
+stage_seconds histogram and, during a request, onto that request's
+Server-Timing header (see trips.middleware.ServerTimingMiddleware).
+Counters and histograms are rendered in the Prometheus text format by
+the /metrics endpoint.
+
+Everything is in-process: each worker exposes its own numbers, as with
+the geocode and route caches. Recording a span costs two perf_counter()
+calls, a bucket bisect and a lock.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Upper bounds in seconds; +Inf is implied
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# (name, seconds) spans of the request being served, or None outside one
+_request_spans = ContextVar("request_spans", default=None)
+
+
+class Counter:
+    def __init__(self, name, help, label):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value):
+        return self._values.get(label_value, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for value, count in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{value}"}} {count}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        # label value -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        slot = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            series[0][slot] += 1
+            series[1] += seconds
+
+    def count(self, label_value):
+        series = self._series.get(label_value)
+        return sum(series[0]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for value, (counts, total) in sorted(self._series.items()):
+                labels = f'{self.label}="{value}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(
+                        f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                    )
+                cumulative += counts[-1]
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+                lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+stage_seconds = Histogram(
+    "trips_stage_seconds", "Time spent in each planning stage.", "stage"
+)
+upstream_seconds = Histogram(
+    "trips_upstream_request_seconds", "Upstream HTTP request latency.", "host"
+)
+upstream_errors = Counter(
+    "trips_upstream_errors_total",
+    "Upstream requests that failed or returned a retryable status.",
+    "host",
+)
+route_fallbacks = Counter(
+    "trips_route_fallbacks_total",
+    "Routes served by a fallback instead of OSRM.",
+    "kind",
+)
+breaker_rejections = Counter(
+    "trips_breaker_rejections_total",
+    "Upstream calls skipped because the circuit breaker was open.",
+    "breaker",
+)
+
+METRICS = (
+    stage_seconds,
+    upstream_seconds,
+    upstream_errors,
+    route_fallbacks,
+    breaker_rejections,
+)
+
+
+def enabled():
+    return getattr(settings, "METRICS_ENABLED", True)
+
+
+def record(name, seconds):
+    """Record a finished stage: histogram plus the current request's spans."""
+    stage_seconds.observe(name, seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as stage `name`."""
+    if not enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def timed_iter(name, iterable):
+    """
+    Iterate `iterable`, recording the time spent producing its items
+    (not the consumer's time between them) as one `name` span.
+    """
+    if not enabled():
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += time.perf_counter() - start
+                return
+            elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        record(name, elapsed)
+
+
+def start_request():
+    """
+    Begin collecting spans for the current request. Returns (spans,
+    token); pass the token to end_request() once the request is done.
+    """
+    spans = []
+    return spans, _request_spans.set(spans)
+
+
+def end_request(token):
+    """Stop collecting spans, so none leak into the next request."""
+    _request_spans.reset(token)
+
+
+def server_timing(spans):
+    """Server-Timing header value for (name, seconds) spans, in order."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans)
+
+
+def render_prometheus():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,75 @@
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8  # as routing.haversine_miles
+
+
+class PathIndex:
+    """
+    Cumulative-distance index over a route path ([[lat, lon], ...]).
+
+    Segment lengths are summed once, vectorized, when the index is built;
+    after that any mile marker resolves to a point by binary search over
+    the cumulative array plus linear interpolation inside the segment,
+    so lookups stay O(log n) on 50k+ point paths.
+
+    Mile markers are in route miles (OSRM's road distance). The path's own
+    haversine length is usually a little shorter, so when `total_miles` is
+    given markers are scaled onto the geometry: the last mile of the route
+    lands on the last point of the path.
+    """
+
+    def __init__(self, path, total_miles=None):
+        points = np.asarray(path, dtype=np.float64).reshape(-1, 2)
+        self.lats = points[:, 0]
+        self.lons = points[:, 1]
+
+        lat = np.radians(self.lats)
+        dlat = np.diff(lat)
+        dlon = np.diff(np.radians(self.lons))
+        a = (
+            np.sin(dlat / 2) ** 2
+            + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+        )
+        segments = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        self.cumulative = np.concatenate(([0.0], np.cumsum(segments)))
+
+        self.length_miles = float(self.cumulative[-1])
+        self.scale = (
+            self.length_miles / total_miles
+            if total_miles and self.length_miles
+            else 1.0
+        )
+
+    def __len__(self):
+        return len(self.lats)
+
+    def locate(self, mile):
+        """[lat, lon] at `mile` along the route, or None for an empty path."""
+        located = self.locate_many([mile])
+        return located[0] if located else None
+
+    def locate_many(self, miles):
+        """locate() for a sequence of mile markers, in one vectorized pass."""
+        if not len(self) or not len(miles):
+            return []
+        # np.interp is exactly binary search + linear interpolation;
+        # markers outside the path clamp to its endpoints
+        along = np.asarray(miles, dtype=np.float64) * self.scale
+        lats = np.interp(along, self.cumulative, self.lats)
+        lons = np.interp(along, self.cumulative, self.lons)
+        return [
+            [round(float(la), 6), round(float(lo), 6)] for la, lo in zip(lats, lons)
+        ]
+
+
+def locate_stops(stops, index):
+    """
+    Add a "location": [lat, lon] to each stop dict from its mile_marker
+    (None when the route has no geometry).
+    """
+    locations = index.locate_many([stop.get("mile_marker") or 0 for stop in stops])
+    if not locations:
+        locations = [None] * len(stops)
+    for stop, location in zip(stops, locations):
+        stop["location"] = location
+    return stops
@@ -0,0 +1,424 @@
+from concurrent.futures import wait
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .geocode_cache import normalize_location
+from .hos_calculator import calculate_hos
+from .hos_engine import calculate_hos_fast, resume_hos
+from .hos_memo import hos_memo
+from .matrix import optimize_stop_order
+from .metrics import span, timed_iter
+from .pool import get_executor
+from .routing import (
+    ageocode_many,
+    aroute_between,
+    calculate_fuel_stops,
+    geocode_each,
+    geocode_many,
+    route_between,
+)
+
+# HOS_ENGINE setting -> implementation; "reference" and "event" produce
+# identical logs, "memo" is "event" behind a memo on inputs rounded to
+# HOS_MEMO_PRECISION
+HOS_ENGINES = {
+    "reference": calculate_hos,
+    "event": calculate_hos_fast,
+    "memo": hos_memo.calculate_hos,
+}
+
+
+def get_hos_engine():
+    return HOS_ENGINES[getattr(settings, "HOS_ENGINE", "memo")]
+
+
+def plan_trip(trip, progress=None, checkpoints=None):
+    """
+    Route a saved Trip and build its plan: route_info and enriched
+    hos_logs, exactly as returned by the create endpoint.
+
+    `progress`, if given, is called with each stage name ("geocode",
+    "route", "hos", "enrich") as the stage starts. `checkpoints`, if a
+    list, receives the HOS engine's per-day resume checkpoints.
+    """
+    report = progress or _no_progress
+    route, route_meta = _route_trip(trip, report)
+    return build_plan(trip, route, route_meta, progress=report, checkpoints=checkpoints)
+
+
+def iter_trip_plan(trip, checkpoints=None):
+    """plan_trip() as an iter_plan() stream."""
+    route, route_meta = _route_trip(trip, _no_progress)
+    return iter_plan(trip, route, route_meta, checkpoints=checkpoints)
+
+
+def _route_trip(trip, report):
+    route_meta = {}
+    report("geocode")
+    with span("geocode"):
+        points = geocode_many(_trip_locations(trip))
+    report("route")
+    points = _order_stops(trip, points, route_meta)
+    with span("route"):
+        route = route_between(points, meta=route_meta)
+    return route, route_meta
+
+
+async def aplan_trip(trip, checkpoints=None):
+    """Async counterpart of plan_trip(); only the routing step awaits I/O."""
+    route_meta = {}
+    with span("geocode"):
+        points = await ageocode_many(_trip_locations(trip))
+    points = await sync_to_async(_order_stops, thread_sensitive=False)(
+        trip, points, route_meta
+    )
+    with span("route"):
+        route = await aroute_between(points, meta=route_meta)
+    return build_plan(trip, route, route_meta, checkpoints=checkpoints)
+
+
+def plan_trips(trips, timeout=None, checkpoints=None):
+    """
+    Plan many saved trips in one go, for the batch endpoint.
+
+    Location strings are de-duplicated across the whole batch (by their
+    normalized cache key) before geocoding, then routing, HOS and
+    enrichment run per trip on the bounded "batch" pool. Returns a list
+    aligned with `trips` holding either the plan dict or the Exception
+    that trip failed with. `checkpoints`, if a list, is extended with one
+    checkpoint list per trip, also aligned with `trips`.
+    """
+    if timeout is None:
+        timeout = getattr(settings, "BATCH_PLANNING_TIMEOUT", 300)
+
+    by_key = {}
+    for trip in trips:
+        for location in _trip_locations(trip):
+            by_key.setdefault(normalize_location(location), location)
+    geocoded = geocode_each(list(by_key.values()), timeout=timeout, pool="batch")
+
+    trip_checkpoints = [[] for _ in trips]
+    executor = get_executor("batch")
+    futures = []
+    for trip, trip_cps in zip(trips, trip_checkpoints):
+        points = [
+            geocoded[by_key[normalize_location(location)]]
+            for location in _trip_locations(trip)
+        ]
+        failed = next((p for p in points if isinstance(p, Exception)), None)
+        if failed is not None:
+            futures.append(failed)
+        else:
+            futures.append(executor.submit(_plan_from_points, trip, points, trip_cps))
+
+    wait([f for f in futures if not isinstance(f, Exception)], timeout=timeout)
+
+    results = []
+    for future in futures:
+        if isinstance(future, Exception):
+            results.append(future)
+        elif not future.done():
+            future.cancel()
+            results.append(Exception(f"Planning timed out after {timeout}s"))
+        elif future.exception() is not None:
+            results.append(future.exception())
+        else:
+            results.append(future.result())
+    if checkpoints is not None:
+        checkpoints.extend(trip_checkpoints)
+    return results
+
+
+def _trip_locations(trip):
+    return (
+        trip.current_location,
+        trip.pickup_location,
+        *(trip.stops or ()),
+        trip.dropoff_location,
+    )
+
+
+def _order_stops(trip, points, route_meta):
+    """
+    Visiting order for a multi-stop trip's geocoded points: the start and
+    pickup come first and the dropoff last, the extra stops in between
+    are ordered for the least drive time unless optimize_stop_order is
+    off. Sets route_meta["stop_order"] to the locations in that order.
+    """
+    locations = _trip_locations(trip)
+    if len(locations) <= 3:
+        return points
+    if trip.optimize_stop_order:
+        with span("matrix"):
+            order = optimize_stop_order(points, fixed=2)
+    else:
+        order = range(len(points))
+    route_meta["stop_order"] = [locations[i] for i in order]
+    return [points[i] for i in order]
+
+
+def _plan_from_points(trip, points, checkpoints=None):
+    route_meta = {}
+    points = _order_stops(trip, points, route_meta)
+    with span("route"):
+        route = route_between(points, meta=route_meta)
+    return build_plan(trip, route, route_meta, checkpoints=checkpoints)
+
+
+def _no_progress(stage):
+    pass
+
+
+def build_plan(trip, route, route_meta=None, progress=None, checkpoints=None):
+    route_info = None
+    enriched_logs = []
+    rest_stops = []
+    for kind, *payload in iter_plan(trip, route, route_meta, progress, checkpoints):
+        if kind == "route_info":
+            route_info = payload[0]
+        else:
+            enriched, day_rest_stops = payload
+            enriched_logs.append(enriched)
+            rest_stops.extend(day_rest_stops)
+    route_info["rest_stops"] = rest_stops
+
+    return {
+        "route_info": route_info,
+        "hos_logs": enriched_logs,
+    }
+
+
+def iter_plan(trip, route, route_meta=None, progress=None, checkpoints=None):
+    """
+    Generator form of build_plan() for streaming responses. Yields
+    ("route_info", route_info) first - its "rest_stops" is left empty,
+    they are only known as days are enriched - then
+    ("day", enriched_log, rest_stops) for each HOS day, with that day's
+    rest stops already located on the path.
+    """
+    distance, duration, path, waypoints = route
+    route_meta = route_meta or {}
+    report = progress or _no_progress
+
+    report("hos")
+    fuel_stops = calculate_fuel_stops(distance)
+
+    engine = get_hos_engine()
+    # the reference engine cannot hand out resume checkpoints
+    engine_kwargs = {}
+    if checkpoints is not None and engine is not calculate_hos:
+        engine_kwargs["checkpoints"] = checkpoints
+    with span("hos"):
+        hos_logs = engine(
+            total_trip_hours=duration,
+            total_distance_miles=distance,
+            current_cycle_used_hours=trip.current_cycle_used_hours,
+            fuel_stops=fuel_stops,
+            **engine_kwargs,
+        )
+
+    # numpy-backed; imported here rather than at start-up
+    from .path_index import PathIndex, locate_stops
+
+    # one distance index per route places every stop on the path
+    path_index = PathIndex(path, distance)
+    locate_stops(fuel_stops, path_index)
+
+    route_info = {
+        "total_distance_miles": distance,
+        "total_duration_hours": duration,
+        "fuel_stops": fuel_stops,
+        "path": path,
+        "waypoints": waypoints,
+        "rest_stops": [],
+        "cached": route_meta.get("cached", False),
+        "degraded": route_meta.get("degraded", False),
+    }
+    if "stop_order" in route_meta:
+        route_info["stop_order"] = route_meta["stop_order"]
+    yield "route_info", route_info
+
+    report("enrich")
+    days = iter_enriched_days(trip, distance, duration, hos_logs)
+    for enriched, rest_stops in timed_iter("enrich", days):
+        locate_stops(rest_stops, path_index)
+        yield "day", enriched, rest_stops
+
+
+def replan_trip(trip, plan, checkpoints, from_day, remaining_trip_hours):
+    """
+    Re-plan a stored plan from the start of `from_day` with a new number
+    of remaining driving hours. Days before `from_day` are kept as they
+    are; the HOS engine resumes from that day's checkpoint, so only the
+    days after the change are simulated and enriched.
+
+    Returns (plan, checkpoints) for the updated plan. Raises ValueError
+    if there is no checkpoint for `from_day`.
+    """
+    if not 1 <= from_day <= len(checkpoints):
+        raise ValueError(f"from_day must be between 1 and {len(checkpoints)}.")
+    checkpoint = checkpoints[from_day - 1]
+
+    new_checkpoints = list(checkpoints[: from_day - 1])
+    records = resume_hos(checkpoint, remaining_trip_hours, new_checkpoints)
+    new_logs = [record.as_log() for record in records]
+
+    route_info = dict(plan["route_info"])
+    kept_logs = [log for log in plan["hos_logs"] if log["day"] < from_day]
+    enriched_logs, rest_stops = enrich_hos_logs(
+        trip,
+        route_info["total_distance_miles"],
+        route_info["total_duration_hours"],
+        new_logs,
+        avg_speed=checkpoint["avg_speed_mph"],
+        miles_before=sum(log["total_miles_driving_today"] for log in kept_logs),
+        total_days=new_logs[-1]["day"],
+    )
+    from .path_index import PathIndex, locate_stops
+
+    locate_stops(
+        rest_stops,
+        PathIndex(route_info["path"], route_info["total_distance_miles"]),
+    )
+
+    driven_before = sum(log["driving_hours"] for log in kept_logs)
+    route_info["total_duration_hours"] = round(driven_before + remaining_trip_hours, 2)
+    route_info["rest_stops"] = [
+        stop for stop in route_info["rest_stops"] if stop["day"] < from_day
+    ] + rest_stops
+    return {
+        "route_info": route_info,
+        "hos_logs": kept_logs + enriched_logs,
+    }, new_checkpoints
+
+
+def enrich_hos_logs(
+    trip,
+    distance,
+    duration,
+    hos_logs,
+    avg_speed=None,
+    miles_before=0.0,
+    total_days=None,
+):
+    """
+    Decorate calculate_hos day logs with dates, from/to labels and
+    per-type totals, and collect rest stops with their mile markers.
+    Returns (enriched_logs, rest_stops).
+
+    `miles_before` and `total_days` let a tail of the logs (a re-plan)
+    be enriched on its own: miles already driven on earlier days and the
+    number of the trip's last day.
+    """
+    enriched_logs = []
+    rest_stops = []
+    for enriched, day_rest_stops in iter_enriched_days(
+        trip, distance, duration, hos_logs, avg_speed, miles_before, total_days
+    ):
+        enriched_logs.append(enriched)
+        rest_stops.extend(day_rest_stops)
+    return enriched_logs, rest_stops
+
+
+def iter_enriched_days(
+    trip,
+    distance,
+    duration,
+    hos_logs,
+    avg_speed=None,
+    miles_before=0.0,
+    total_days=None,
+):
+    """
+    Generator behind enrich_hos_logs(): yields (enriched_log, rest_stops)
+    per day, walking each day's activities once for both its totals and
+    its rest stops.
+    """
+    if avg_speed is None:
+        avg_speed = (distance / duration) if duration > 0 else 55.0
+
+    base_date = trip.created_at.date()
+    if total_days is None:
+        total_days = len(hos_logs)
+    cumulative_miles_before = miles_before
+
+    for entry in hos_logs:
+        rest_stops = []
+        day_index = entry["day"] - 1
+        the_date = base_date + timedelta(days=day_index)
+
+        if entry["day"] == 1:
+            _from = trip.current_location
+        else:
+            _from = "Enroute"
+
+        if entry["day"] == total_days:
+            _to = trip.dropoff_location
+        elif entry["day"] == 1 and entry.get("miles_driven", 0.0) == 0:
+            _to = trip.pickup_location
+        else:
+            _to = "Enroute"
+
+        totals = {
+            "DRIVING": 0.0,
+            "ON_DUTY": 0.0,
+            "OFF_DUTY": 0.0,
+            "SLEEPER_BERTH": 0.0,
+        }
+        driving_miles_accum = 0.0
+        for act in entry["activities"]:
+            typ = act["type"]
+            dur = act.get("duration", 0.0)
+            if typ == "DRIVING":
+                totals["DRIVING"] += dur
+                driving_miles_accum += dur * avg_speed
+            elif typ == "ON_DUTY":
+                totals["ON_DUTY"] += dur
+            elif typ == "OFF_DUTY":
+                totals["OFF_DUTY"] += dur
+            elif typ == "SLEEPER_BERTH":
+                totals["SLEEPER_BERTH"] += dur
+
+            # detect rest stops (SLEEPER_BERTH and OFF_DUTY of significant length)
+            if typ == "SLEEPER_BERTH" and dur > 0:
+                mile_marker = round(cumulative_miles_before + driving_miles_accum, 2)
+                rest_stops.append(
+                    {
+                        "day": entry["day"],
+                        "type": "SLEEPER_BERTH",
+                        "start": act.get("start"),
+                        "duration": dur,
+                        "mile_marker": mile_marker,
+                    }
+                )
+            if typ == "OFF_DUTY" and dur >= 0.5:
+                mile_marker = round(cumulative_miles_before + driving_miles_accum, 2)
+                rest_stops.append(
+                    {
+                        "day": entry["day"],
+                        "type": "OFF_DUTY",
+                        "start": act.get("start"),
+                        "duration": dur,
+                        "mile_marker": mile_marker,
+                    }
+                )
+
+        cumulative_miles_before += entry.get("miles_driven", 0.0)
+
+        enriched = {
+            "day": entry["day"],
+            "date": the_date.isoformat(),
+            "from": _from,
+            "to": _to,
+            "total_miles_driving_today": entry.get("miles_driven", 0.0),
+            "total_hours": entry.get("total_hours", 0.0),
+            "driving_hours": entry.get("driving_hours", 0.0),
+            "on_duty_hours": entry.get("on_duty_hours", 0.0),
+            "off_duty_hours": entry.get("off_duty_hours", 0.0),
+            "sleeper_hours": entry.get("sleeper_hours", 0.0),
+            "totals": totals,
+            "activities": entry["activities"],
+        }
+        yield enriched, rest_stops
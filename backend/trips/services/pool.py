@@ -0,0 +1,44 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# name -> setting holding that pool's max_workers (and its default)
+POOL_SIZES = {
+    "upstream": ("UPSTREAM_FANOUT_WORKERS", 8),
+    "batch": ("BATCH_PLANNING_WORKERS", 8),
+    "jobs": ("TRIP_JOB_WORKERS", 4),
+}
+
+_lock = threading.Lock()
+_executors = {}
+_executors_pid = None
+
+
+def get_executor(name="upstream"):
+    """
+    Bounded thread pool shared by every request in this worker process.
+
+    "upstream" serves per-request fan-out; "batch" and "jobs" are kept
+    separate so large batches and background plans cannot starve
+    interactive requests. Pools are re-created after a fork so gunicorn
+    workers never inherit the master's (threadless) pools.
+    """
+    global _executors_pid
+    pid = os.getpid()
+    executor = _executors.get(name) if _executors_pid == pid else None
+    if executor is None:
+        with _lock:
+            if _executors_pid != pid:
+                _executors.clear()
+                _executors_pid = pid
+            executor = _executors.get(name)
+            if executor is None:
+                setting, default = POOL_SIZES[name]
+                executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, setting, default),
+                    thread_name_prefix=f"trips-{name}",
+                )
+                _executors[name] = executor
+    return executor
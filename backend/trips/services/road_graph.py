@@ -0,0 +1,356 @@
+"""
+Offline road-graph router, used when OSRM is down (or instead of it).
+
+The graph is a directed road network stored as CSR arrays: the edges
+leaving node v are indices[indptr[v]:indptr[v + 1]], with per-edge
+length (metres) and travel time (seconds). Query-time arrays are kept
+in array.array, so a 1M-edge graph costs a few tens of MB and the
+search loop reads plain Python floats.
+
+Shortest (fastest) paths use bidirectional A* with average potentials:
+both searches run on the same reduced costs, so the usual bidirectional
+Dijkstra stopping rule stays exact.
+"""
+
+import csv
+import heapq
+import logging
+import threading
+from array import array
+from math import asin, cos, radians, sin, sqrt
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_MILE = 1609.34
+ONEWAY = ("1", "true", "yes")
+INF = float("inf")
+
+
+class NoRouteError(Exception):
+    pass
+
+
+class RoadGraph:
+    def __init__(self, lats, lons, indptr, indices, length_m, duration_s):
+        self.node_count = len(lats)
+        self.edge_count = len(indices)
+
+        # NumPy copies only for vectorized snapping
+        self._np_lats = np.asarray(lats, dtype=np.float64)
+        self._np_lons = np.asarray(lons, dtype=np.float64)
+
+        self.lats = array("d", self._np_lats.tobytes())
+        self.lons = array("d", self._np_lons.tobytes())
+        # per-node terms of the A* potential, precomputed once
+        self._rlats = array("d", np.radians(self._np_lats).tobytes())
+        self._rlons = array("d", np.radians(self._np_lons).tobytes())
+        self._coslats = array("d", np.cos(np.radians(self._np_lats)).tobytes())
+        self.indptr = _int_array(indptr)
+        self.indices = _int_array(indices)
+        self.length_m = array("d", np.asarray(length_m, np.float64).tobytes())
+        self.duration_s = array("d", np.asarray(duration_s, np.float64).tobytes())
+        self._build_reverse(indptr, indices)
+
+        # Highest "crow-flight speed" over any edge - the straight-line
+        # distance between its ends (or its length, if longer) over its
+        # travel time. Dividing great-circle distance by it gives a
+        # consistent A* potential even where edge lengths are understated.
+        sources = self._edge_sources(indptr)
+        targets = np.asarray(indices, dtype=np.int64)
+        crow = _haversine_m_np(
+            self._np_lats[sources],
+            self._np_lons[sources],
+            self._np_lats[targets],
+            self._np_lons[targets],
+        )
+        reach = np.maximum(np.asarray(length_m, dtype=np.float64), crow)
+        durations = np.asarray(duration_s, dtype=np.float64)
+        moving = durations > 0
+        self.max_speed_mps = (
+            float((reach[moving] / durations[moving]).max()) if moving.any() else 1.0
+        )
+
+    def _edge_sources(self, indptr):
+        indptr = np.asarray(indptr, dtype=np.int64)
+        return np.repeat(np.arange(self.node_count), np.diff(indptr))
+
+    def _build_reverse(self, indptr, indices):
+        # Transposed CSR for the backward search; rev_edge maps each
+        # reverse slot to its forward edge id (for length/duration).
+        targets = np.asarray(indices, dtype=np.int64)
+        sources = self._edge_sources(indptr)
+        order = np.argsort(targets, kind="stable")
+        counts = np.bincount(targets, minlength=self.node_count)
+        rev_indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.rev_indptr = _int_array(rev_indptr)
+        self.rev_indices = _int_array(sources[order])
+        self.rev_edge = _int_array(order)
+
+    # Loading ---------------------------------------------------------------
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph written by save() (a NumPy .npz archive)."""
+        with np.load(path) as data:
+            return cls(
+                data["lats"],
+                data["lons"],
+                data["indptr"],
+                data["indices"],
+                data["length_m"],
+                data["duration_s"],
+            )
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            lats=self._np_lats,
+            lons=self._np_lons,
+            indptr=np.frombuffer(self.indptr, dtype=np.int32),
+            indices=np.frombuffer(self.indices, dtype=np.int32),
+            length_m=np.frombuffer(self.length_m, dtype=np.float64),
+            duration_s=np.frombuffer(self.duration_s, dtype=np.float64),
+        )
+
+    @classmethod
+    def from_csv(cls, nodes_path, edges_path):
+        """
+        Build a graph from two CSV files with header rows:
+        nodes - id,lat,lon
+        edges - source,target,length_m,duration_s[,oneway]
+        Edges are two-way unless oneway is 1/true/yes.
+        """
+        ids = {}
+        lats, lons = [], []
+        with open(nodes_path, newline="") as f:
+            for row in csv.DictReader(f):
+                ids[row["id"]] = len(lats)
+                lats.append(float(row["lat"]))
+                lons.append(float(row["lon"]))
+
+        sources, targets, lengths, durations = [], [], [], []
+        with open(edges_path, newline="") as f:
+            for row in csv.DictReader(f):
+                u, v = ids[row["source"]], ids[row["target"]]
+                length, duration = float(row["length_m"]), float(row["duration_s"])
+                sources.append(u)
+                targets.append(v)
+                lengths.append(length)
+                durations.append(duration)
+                if (row.get("oneway") or "").strip().lower() not in ONEWAY:
+                    sources.append(v)
+                    targets.append(u)
+                    lengths.append(length)
+                    durations.append(duration)
+
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind="stable")
+        counts = np.bincount(sources, minlength=len(lats))
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return cls(
+            lats,
+            lons,
+            indptr,
+            np.asarray(targets, dtype=np.int64)[order],
+            np.asarray(lengths)[order],
+            np.asarray(durations)[order],
+        )
+
+    # Queries ---------------------------------------------------------------
+
+    def nearest_node(self, lat, lon):
+        """(node, distance in metres) of the graph node closest to a point."""
+        kx = cos(radians(lat))
+        d2 = (self._np_lats - lat) ** 2 + ((self._np_lons - lon) * kx) ** 2
+        node = int(np.argmin(d2))
+        return node, _haversine_m(lat, lon, self.lats[node], self.lons[node])
+
+    def shortest_path(self, source, target):
+        """
+        Fastest path between two nodes with bidirectional A*.
+        Returns (nodes, length_m, duration_s); raises NoRouteError.
+        """
+        if source == target:
+            return [source], 0.0, 0.0
+
+        rlats, rlons, coslats = self._rlats, self._rlons, self._coslats
+        s_lat, s_lon, s_cos = rlats[source], rlons[source], coslats[source]
+        t_lat, t_lon, t_cos = rlats[target], rlons[target], coslats[target]
+        # great-circle seconds at max speed; the 1/2 of the average
+        # potential cancels haversine's 2R
+        scale = EARTH_RADIUS_M / self.max_speed_mps
+        potentials = {}
+
+        def p_f(v):
+            # average potential: (h_to_target(v) - h_from_source(v)) / 2
+            la, lo, cl = rlats[v], rlons[v], coslats[v]
+            a_t = sin((t_lat - la) / 2) ** 2 + cl * t_cos * sin((t_lon - lo) / 2) ** 2
+            a_s = sin((la - s_lat) / 2) ** 2 + s_cos * cl * sin((lo - s_lon) / 2) ** 2
+            p = (asin(sqrt(min(a_t, 1.0))) - asin(sqrt(min(a_s, 1.0)))) * scale
+            potentials[v] = p
+            return p
+
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: (-1, -1)}, {target: (-1, -1)})
+        done = (set(), set())
+        heaps = ([(0.0, source)], [(0.0, target)])
+        graph = (
+            (self.indptr, self.indices, None),
+            (self.rev_indptr, self.rev_indices, self.rev_edge),
+        )
+        durations = self.duration_s
+
+        best = INF
+        meet = -1
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            d_u, u = heapq.heappop(heaps[side])
+            if u in done[side]:
+                continue
+            done[side].add(u)
+
+            sign = 1.0 if side == 0 else -1.0
+            ptr, idx, edge_of = graph[side]
+            my_dist, other_dist = dist[side], dist[1 - side]
+            my_parent, heap = parent[side], heaps[side]
+            pu = sign * potentials[u] if u in potentials else sign * p_f(u)
+            for slot in range(ptr[u], ptr[u + 1]):
+                v = idx[slot]
+                edge = slot if edge_of is None else edge_of[slot]
+                pv = potentials.get(v)
+                if pv is None:
+                    pv = p_f(v)
+                # reduced cost, identical for both directions
+                nd = d_u + durations[edge] - pu + sign * pv
+                if nd < my_dist.get(v, INF):
+                    my_dist[v] = nd
+                    my_parent[v] = (u, edge)
+                    heapq.heappush(heap, (nd, v))
+                    if v in other_dist and nd + other_dist[v] < best:
+                        best = nd + other_dist[v]
+                        meet = v
+
+        if meet < 0:
+            raise NoRouteError("No road connection between the points.")
+
+        forward, backward = [], []
+        v = meet
+        while v != -1:
+            forward.append(v)
+            v, edge = parent[0][v]
+            if edge >= 0:
+                backward.append(edge)
+        forward.reverse()
+        edges = backward[::-1]
+        v, edge = parent[1][meet]
+        while v != -1:
+            forward.append(v)
+            edges.append(edge)
+            v, edge = parent[1][v]
+
+        length = sum(self.length_m[e] for e in edges)
+        duration = sum(durations[e] for e in edges)
+        return forward, length, duration
+
+    def route(self, points, max_snap_m=None):
+        """
+        Route through (lat, lon) points in order. Returns the same tuple
+        as routing.calculate_route: (distance_miles, duration_hours, path,
+        waypoints) with waypoints snapped to the graph.
+        """
+        snapped = []
+        for lat, lon in points:
+            node, off = self.nearest_node(lat, lon)
+            if max_snap_m is not None and off > max_snap_m:
+                raise NoRouteError(
+                    f"({lat}, {lon}) is {off / METERS_PER_MILE:.1f} mi from the road graph."
+                )
+            snapped.append(node)
+
+        path_nodes = [snapped[0]]
+        length = duration = 0.0
+        for a, b in zip(snapped, snapped[1:]):
+            nodes, leg_length, leg_duration = self.shortest_path(a, b)
+            path_nodes.extend(nodes[1:])
+            length += leg_length
+            duration += leg_duration
+
+        return (
+            round(length / METERS_PER_MILE, 2),
+            round(duration / 3600, 2),
+            [[self.lats[v], self.lons[v]] for v in path_nodes],
+            [[self.lats[v], self.lons[v]] for v in snapped],
+        )
+
+
+def _int_array(values):
+    return array("i", np.asarray(values, dtype=np.int32).tobytes())
+
+
+def _haversine_m_np(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = (
+        sin(dlat / 2) ** 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * asin(sqrt(min(a, 1.0)))
+
+
+_lock = threading.Lock()
+_graph = None
+_graph_path = None
+
+
+def get_road_graph():
+    """
+    The graph at ROAD_GRAPH_PATH, loaded once per process; None when no
+    graph is configured or it cannot be loaded.
+    """
+    global _graph, _graph_path
+    path = getattr(settings, "ROAD_GRAPH_PATH", None)
+    if not path:
+        return None
+    if _graph_path != path:
+        with _lock:
+            if _graph_path != path:
+                try:
+                    _graph = RoadGraph.load(path)
+                    logger.info(
+                        "Loaded road graph %s (%d nodes, %d edges)",
+                        path,
+                        _graph.node_count,
+                        _graph.edge_count,
+                    )
+                except (OSError, KeyError, ValueError):
+                    logger.exception("Could not load road graph %s", path)
+                    _graph = None
+                _graph_path = path
+    return _graph
+
+
+def local_route(points):
+    """
+    Route with the local road graph. Raises NoRouteError when there is no
+    graph, a point is too far from it, or the points aren't connected.
+    """
+    graph = get_road_graph()
+    if graph is None:
+        raise NoRouteError("No road graph available.")
+    max_snap_miles = getattr(settings, "ROAD_GRAPH_MAX_SNAP_MILES", 25)
+    return graph.route(points, max_snap_m=max_snap_miles * METERS_PER_MILE)
@@ -0,0 +1,88 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class RouteCache:
+    """
+    calculate_route results shared through Django's cache framework.
+
+    Keys are the routed points rounded to ROUTE_CACHE_PRECISION decimal
+    places (4 ~= 11 m), so tiny geocoder jitter still hits. TTL and entry
+    limits come from the configured cache alias (see CACHES["routes"]);
+    with the file-based backend every worker on the box shares entries.
+    """
+
+    def __init__(self, alias=None, precision=None):
+        self.alias = alias or getattr(settings, "ROUTE_CACHE_ALIAS", "routes")
+        self.precision = (
+            precision
+            if precision is not None
+            else getattr(settings, "ROUTE_CACHE_PRECISION", 4)
+        )
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, points):
+        p = self.precision
+        raw = ";".join(f"{float(lat):.{p}f},{float(lon):.{p}f}" for lat, lon in points)
+        return "route:v1:" + hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, points):
+        value = self.cache.get(self.key(points))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return tuple(value) if value is not None else None
+
+    def set(self, points, route):
+        # (distance_miles, duration_hours, path, waypoints)
+        self.cache.set(self.key(points), tuple(route))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "alias": self.alias,
+                "precision": self.precision,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class LegCache(RouteCache):
+    """
+    Point-to-point (distance_miles, duration_hours) legs for the
+    multi-stop distance matrix, keyed like RouteCache on rounded points.
+    Legs are directional: OSRM's A->B and B->A can differ.
+    """
+
+    def key(self, points):
+        return "leg:v1:" + super().key(points).split(":")[-1]
+
+    def get_many(self, pairs):
+        """{(a, b): leg} for the pairs that are cached."""
+        keys = {self.key(pair): pair for pair in pairs}
+        found = self.cache.get_many(list(keys))
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return {keys[key]: tuple(leg) for key, leg in found.items()}
+
+    def set_many(self, legs):
+        """Cache {(a, b): (distance_miles, duration_hours)}."""
+        self.cache.set_many({self.key(pair): tuple(leg) for pair, leg in legs.items()})
+
+
+route_cache = RouteCache()
+leg_cache = LegCache()
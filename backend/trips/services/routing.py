@@ -1,106 +1,407 @@
-import requests
+import asyncio
+import logging
+import time
+from concurrent.futures import wait
+from math import radians, sin, cos, sqrt, atan2
 
-HEADERS = {"User-Agent": "tripcop-eld-planner"}
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics, upstream
+from .circuit_breaker import osrm_breaker
+from .gazetteer import get_gazetteer
+from .geocode_cache import geocode_cache
+from .pool import get_executor
+from .route_cache import route_cache
+
+logger = logging.getLogger(__name__)
 
 
 def geocode_location(location):
+    """
+    Resolve a free-text location to (lat, lon).
+    Served from the local gazetteer or the geocode cache when possible,
+    Nominatim otherwise.
+    """
+    coords = _geocode_gazetteer(location)
+    if coords is not None:
+        return coords
+    return geocode_cache.get_or_fetch(location, _geocode_nominatim)
+
+
+def _geocode_gazetteer(location):
+    gazetteer = get_gazetteer()
+    return gazetteer.lookup(location) if gazetteer is not None else None
+
+
+def _geocode_nominatim(location):
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": location, "format": "json", "limit": 1}
-    response = requests.get(url, params=params, headers=HEADERS, timeout=10)
+    response = upstream.get(url, params=params)
     data = response.json()
     if not data:
         raise Exception(f"Location not found: {location}")
     return float(data[0]["lat"]), float(data[0]["lon"])
 
 
-def calculate_route(start, pickup, dropoff):
+def geocode_many(locations, timeout=None):
+    """
+    Geocode several locations concurrently on the shared upstream pool.
+
+    Returns coordinates in input order. Errors surface exactly as with
+    sequential geocode_location calls: the first failing location, in
+    input order, raises. The whole fan-out is bounded by `timeout`
+    seconds (ROUTING_FANOUT_TIMEOUT by default).
+    """
+    results = geocode_each(locations, timeout=timeout)
+    for location in locations:
+        if isinstance(results[location], Exception):
+            raise results[location]
+    return [results[location] for location in locations]
+
+
+def geocode_each(locations, timeout=None, pool="upstream"):
+    """
+    Geocode each distinct location concurrently on the named pool.
+    Returns {location: (lat, lon) or the Exception it raised}; lookups
+    still running at the deadline are cancelled and reported as timeouts.
+    """
+    if timeout is None:
+        timeout = getattr(settings, "ROUTING_FANOUT_TIMEOUT", 25)
+
+    executor = get_executor(pool)
+    futures = {}
+    for location in locations:
+        if location not in futures:
+            futures[location] = executor.submit(geocode_location, location)
+
+    _, pending = wait(futures.values(), timeout=timeout)
+    results = {}
+    for location, future in futures.items():
+        if future in pending:
+            future.cancel()
+            results[location] = Exception(f"Geocoding timed out after {timeout}s")
+        elif future.exception() is not None:
+            results[location] = future.exception()
+        else:
+            results[location] = future.result()
+    return results
+
+
+def calculate_route(start, pickup, dropoff, meta=None):
     """
     Calculate route distance, duration, path and waypoints using OSRM.
     Falls back to simple straight-line path if OSRM fails.
     Returns: (distance_miles, duration_hours, path, waypoints_coords)
+
+    If `meta` is a dict it is filled with flags describing how the route
+    was served: meta["cached"], and meta["degraded"] when OSRM was
+    unavailable and a fallback answered.
     """
-    start_lat, start_lon = geocode_location(start)
-    pickup_lat, pickup_lon = geocode_location(pickup)
-    drop_lat, drop_lon = geocode_location(dropoff)
+    points = geocode_many([start, pickup, dropoff])
+    return route_between(points, meta=meta)
 
-    coordinates = (
-        f"{start_lon},{start_lat};{pickup_lon},{pickup_lat};{drop_lon},{drop_lat}"
-    )
+
+def route_between(points, meta=None):
+    """
+    Route through already-geocoded (lat, lon) points, in order.
+    Successful OSRM results are shared through the route cache; when
+    OSRM fails the local road graph answers (see LOCAL_ROUTING), then
+    the straight-line estimate. While the OSRM circuit breaker is open
+    the fallbacks answer straight away. Fallbacks are never cached.
+    """
+    if meta is None:
+        meta = {}
+    meta["degraded"] = False
+
+    road_graph = _road_graph()
+    if road_graph is not None and _local_routing() == "primary":
+        meta["cached"] = False
+        try:
+            return road_graph.local_route(points)
+        except road_graph.NoRouteError as e:
+            logger.warning("Local routing failed: %s", e)
+
+    cached = route_cache.get(points)
+    meta["cached"] = cached is not None
+    if cached is not None:
+        return cached
+
+    if not osrm_breaker.allow():
+        logger.debug("OSRM circuit open, using fallback route")
+        meta["degraded"] = True
+        return _fallback_route(points)
+
+    try:
+        result = _osrm_route(points)
+    except Exception as e:
+        logger.warning("OSRM failed, using fallback route: %s", e)
+        meta["degraded"] = True
+        return _fallback_route(points)
+
+    route_cache.set(points, result)
+    return result
+
+
+def _local_routing():
+    # "fallback" (default), "primary" or "off"
+    return getattr(settings, "LOCAL_ROUTING", "fallback")
+
+
+def _road_graph():
+    """
+    The road_graph module when a graph is configured, else None. It pulls
+    in numpy, so it is only imported once ROAD_GRAPH_PATH is set.
+    """
+    if not getattr(settings, "ROAD_GRAPH_PATH", None):
+        return None
+    from . import road_graph
+
+    return road_graph
+
+
+def _fallback_route(points):
+    road_graph = _road_graph()
+    if (
+        road_graph is not None
+        and _local_routing() == "fallback"
+        and road_graph.get_road_graph() is not None
+    ):
+        try:
+            route = road_graph.local_route(points)
+            metrics.route_fallbacks.inc("local")
+            return route
+        except road_graph.NoRouteError as e:
+            logger.warning("Local routing failed: %s", e)
+    metrics.route_fallbacks.inc("straight_line")
+    return _straight_line_route(points)
+
+
+def _osrm_request(points):
+    coordinates = ";".join(f"{lon},{lat}" for lat, lon in points)
     osrm_url = f"https://router.project-osrm.org/route/v1/driving/{coordinates}"
     params = {"overview": "full", "geometries": "geojson"}
+    return osrm_url, params
+
 
+def _osrm_route(points):
+    osrm_url, params = _osrm_request(points)
+    start = time.perf_counter()
+    r = None
     try:
-        r = requests.get(osrm_url, params=params, headers=HEADERS, timeout=15)
-        data = r.json()
-        # log for debugging
-        print("OSRM RESPONSE code:", data.get("code"))
-        if data.get("code") != "Ok":
-            raise ValueError("OSRM returned non-Ok code")
-
-        route = data["routes"][0]
-        distance_miles = route["distance"] / 1609.34
-        duration_hours = route["duration"] / 3600
-        path = [[lat, lon] for lon, lat in route["geometry"]["coordinates"]]
-
-        waypoints = data.get("waypoints", [])
-        waypoints_coords = []
-        for wp in waypoints:
-            loc = wp.get("location")
-            if loc and len(loc) >= 2:
-                waypoints_coords.append([loc[1], loc[0]])
-
-        if len(waypoints_coords) < 3:
-            waypoints_coords = [
-                [start_lat, start_lon],
-                [pickup_lat, pickup_lon],
-                [drop_lat, drop_lon],
-            ]
-
-        return (
-            round(distance_miles, 2),
-            round(duration_hours, 2),
-            path,
-            waypoints_coords,
+        r = upstream.get(
+            osrm_url,
+            params=params,
+            read_timeout=getattr(settings, "OSRM_READ_TIMEOUT", 15),
         )
+    finally:
+        _record_osrm_call(r, time.perf_counter() - start)
+    return _parse_osrm_route(r.json(), points)
 
-    except Exception as e:
-        print("OSRM failed:", e)
-        # fallback straight-line
-        path = [
-            [start_lat, start_lon],
-            [pickup_lat, pickup_lon],
-            [drop_lat, drop_lon],
-        ]
-
-        # simple haversine distance for estimation
-        from math import radians, sin, cos, sqrt, atan2
-
-        def hav(lat1, lon1, lat2, lon2):
-            R = 3958.8
-            dlat = radians(lat2 - lat1)
-            dlon = radians(lon2 - lon1)
-            a = (
-                sin(dlat / 2) ** 2
-                + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-            )
-            c = 2 * atan2(sqrt(a), sqrt(1 - a))
-            return R * c
 
-        distance_miles = hav(start_lat, start_lon, pickup_lat, pickup_lon) + hav(
-            pickup_lat, pickup_lon, drop_lat, drop_lon
+def _record_osrm_call(response, elapsed):
+    # Only transport errors and 429/5xx trip the breaker; an Ok-less
+    # answer such as "NoRoute" means OSRM itself is healthy.
+    if response is None or response.status_code in upstream.RETRY_STATUSES:
+        osrm_breaker.record_failure()
+    else:
+        osrm_breaker.record_success(elapsed)
+
+
+def osrm_table(points):
+    """
+    Pairwise (distances_miles, durations_hours) matrices between points
+    from the OSRM table service; cells OSRM could not route are None.
+    Raises when OSRM fails or its circuit breaker is open.
+    """
+    if not osrm_breaker.allow():
+        raise ConnectionError("OSRM circuit open")
+    coordinates = ";".join(f"{lon},{lat}" for lat, lon in points)
+    url = f"https://router.project-osrm.org/table/v1/driving/{coordinates}"
+    start = time.perf_counter()
+    r = None
+    try:
+        r = upstream.get(
+            url,
+            params={"annotations": "duration,distance"},
+            read_timeout=getattr(settings, "OSRM_READ_TIMEOUT", 15),
         )
-        duration_hours = distance_miles / 55.0 if distance_miles > 0 else 0.0
-
-        return (
-            round(distance_miles, 2),
-            round(duration_hours, 2),
-            path,
-            [
-                [start_lat, start_lon],
-                [pickup_lat, pickup_lon],
-                [drop_lat, drop_lon],
-            ],
+    finally:
+        _record_osrm_call(r, time.perf_counter() - start)
+
+    data = r.json()
+    if data.get("code") != "Ok":
+        raise ValueError("OSRM table returned non-Ok code")
+    distances = [
+        [d / 1609.34 if d is not None else None for d in row]
+        for row in data["distances"]
+    ]
+    durations = [
+        [d / 3600 if d is not None else None for d in row] for row in data["durations"]
+    ]
+    return distances, durations
+
+
+def _parse_osrm_route(data, points):
+    logger.debug("OSRM route response code: %s", data.get("code"))
+    if data.get("code") != "Ok":
+        raise ValueError("OSRM returned non-Ok code")
+
+    route = data["routes"][0]
+    distance_miles = route["distance"] / 1609.34
+    duration_hours = route["duration"] / 3600
+    path = [[lat, lon] for lon, lat in route["geometry"]["coordinates"]]
+
+    waypoints = data.get("waypoints", [])
+    waypoints_coords = []
+    for wp in waypoints:
+        loc = wp.get("location")
+        if loc and len(loc) >= 2:
+            waypoints_coords.append([loc[1], loc[0]])
+
+    if len(waypoints_coords) < len(points):
+        waypoints_coords = [[lat, lon] for lat, lon in points]
+
+    return (
+        round(distance_miles, 2),
+        round(duration_hours, 2),
+        path,
+        waypoints_coords,
+    )
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    R = 3958.8
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = (
+        sin(dlat / 2) ** 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    )
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return R * c
+
+
+def _straight_line_route(points):
+    # fallback straight-line
+    path = [[lat, lon] for lat, lon in points]
+
+    # simple haversine distance for estimation
+    distance_miles = 0
+    for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+        distance_miles += haversine_miles(lat1, lon1, lat2, lon2)
+    duration_hours = distance_miles / 55.0 if distance_miles > 0 else 0.0
+
+    return (
+        round(distance_miles, 2),
+        round(duration_hours, 2),
+        path,
+        [[lat, lon] for lat, lon in points],
+    )
+
+
+# Async variants ------------------------------------------------------------
+# Same semantics as the sync functions above, for the ASGI create endpoint.
+# Upstream calls are awaited on the shared httpx client; cache lookups
+# touch the ORM / cache backends and go through sync_to_async.
+
+
+async def ageocode_location(location):
+    coords = _geocode_gazetteer(location)
+    if coords is not None:
+        return coords
+    coords = await sync_to_async(geocode_cache.get)(location)
+    if coords is None:
+        coords = await _ageocode_nominatim(location)
+        await sync_to_async(geocode_cache.set)(location, coords)
+    return coords
+
+
+async def _ageocode_nominatim(location):
+    url = "https://nominatim.openstreetmap.org/search"
+    params = {"q": location, "format": "json", "limit": 1}
+    response = await upstream.aget(url, params=params)
+    data = response.json()
+    if not data:
+        raise Exception(f"Location not found: {location}")
+    return float(data[0]["lat"]), float(data[0]["lon"])
+
+
+async def ageocode_many(locations, timeout=None):
+    if timeout is None:
+        timeout = getattr(settings, "ROUTING_FANOUT_TIMEOUT", 25)
+
+    unique = list(dict.fromkeys(locations))
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(
+                *(ageocode_location(loc) for loc in unique), return_exceptions=True
+            ),
+            timeout=timeout,
         )
+    except asyncio.TimeoutError:
+        raise Exception(f"Geocoding timed out after {timeout}s")
+
+    # Raise the first failure in input order, like the sequential path
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+    by_location = dict(zip(unique, results))
+    return [by_location[location] for location in locations]
+
+
+async def acalculate_route(start, pickup, dropoff, meta=None):
+    points = await ageocode_many([start, pickup, dropoff])
+    return await aroute_between(points, meta=meta)
+
+
+async def aroute_between(points, meta=None):
+    if meta is None:
+        meta = {}
+    meta["degraded"] = False
+
+    road_graph = _road_graph()
+    if road_graph is not None and _local_routing() == "primary":
+        meta["cached"] = False
+        try:
+            return await sync_to_async(road_graph.local_route, thread_sensitive=False)(
+                points
+            )
+        except road_graph.NoRouteError as e:
+            logger.warning("Local routing failed: %s", e)
+
+    cached = await sync_to_async(route_cache.get)(points)
+    meta["cached"] = cached is not None
+    if cached is not None:
+        return cached
+
+    fallback = sync_to_async(_fallback_route, thread_sensitive=False)
+    if not await sync_to_async(osrm_breaker.allow)():
+        logger.debug("OSRM circuit open, using fallback route")
+        meta["degraded"] = True
+        return await fallback(points)
+
+    try:
+        osrm_url, params = _osrm_request(points)
+        start = time.perf_counter()
+        r = None
+        try:
+            r = await upstream.aget(
+                osrm_url,
+                params=params,
+                read_timeout=getattr(settings, "OSRM_READ_TIMEOUT", 15),
+            )
+        finally:
+            await sync_to_async(_record_osrm_call)(r, time.perf_counter() - start)
+        result = _parse_osrm_route(r.json(), points)
+    except Exception as e:
+        logger.warning("OSRM failed, using fallback route: %s", e)
+        meta["degraded"] = True
+        return await fallback(points)
+
+    await sync_to_async(route_cache.set)(points, result)
+    return result
 
 
 def calculate_fuel_stops(distance_miles):
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+HEADERS = {"User-Agent": "tripcop-eld-planner"}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class JitteredRetry(Retry):
+    """
+    urllib3 Retry with "full jitter" exponential backoff and a cap on
+    how long a Retry-After header may make us sleep.
+    """
+
+    max_retry_after = 10
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff > 0 else 0
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def build_session():
+    # 429/5xx and refused connects only: a read timeout or a connection
+    # dropped mid-response is raised as is (read=False, other=0)
+    retry = JitteredRetry(
+        total=_setting("UPSTREAM_MAX_RETRIES", 3),
+        connect=_setting("UPSTREAM_CONNECT_RETRIES", 1),
+        read=False,
+        other=0,
+        backoff_factor=_setting("UPSTREAM_BACKOFF_FACTOR", 0.5),
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    retry.max_retry_after = _setting("UPSTREAM_RETRY_AFTER_MAX", 10)
+    adapter = HTTPAdapter(
+        pool_connections=_setting("UPSTREAM_POOL_CONNECTIONS", 4),
+        pool_maxsize=_setting("UPSTREAM_POOL_MAXSIZE", 16),
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+
+def get_session():
+    """
+    Keep-alive Session shared by every thread in this worker process.
+    Rebuilt after a fork so workers never share sockets with the master.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _lock:
+            if _session is None or _session_pid != pid:
+                _session = build_session()
+                _session_pid = pid
+    return _session
+
+
+def get(url, params=None, read_timeout=None):
+    """
+    GET through the pooled session with separate connect/read timeouts.
+    429/5xx responses are retried with backoff before being returned;
+    failed connects up to UPSTREAM_CONNECT_RETRIES times. Read timeouts
+    are raised straight away.
+    """
+    timeout = (
+        _setting("UPSTREAM_CONNECT_TIMEOUT", 3.05),
+        read_timeout or _setting("UPSTREAM_READ_TIMEOUT", 10),
+    )
+    start = time.perf_counter()
+    response = None
+    try:
+        response = get_session().get(url, params=params, timeout=timeout)
+    finally:
+        _observe(url, start, response)
+    return response
+
+
+def _observe(url, start, response):
+    # response is None when the request raised
+    if not metrics.enabled():
+        return
+    host = urlsplit(url).hostname
+    metrics.upstream_seconds.observe(host, time.perf_counter() - start)
+    if response is None or response.status_code in RETRY_STATUSES:
+        metrics.upstream_errors.inc(host)
+
+
+# Async variant -------------------------------------------------------------
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    Keep-alive httpx.AsyncClient for the running event loop, with the
+    same pool limits as the sync Session.
+    """
+    import httpx  # only the ASGI path needs it; keeps WSGI start-up lean
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            headers=HEADERS,
+            limits=httpx.Limits(
+                max_connections=_setting("UPSTREAM_POOL_MAXSIZE", 16),
+                max_keepalive_connections=_setting("UPSTREAM_POOL_MAXSIZE", 16),
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - timezone.now()).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, min(seconds, _setting("UPSTREAM_RETRY_AFTER_MAX", 10)))
+
+
+async def aget(url, params=None, read_timeout=None):
+    """Async counterpart of get(): same timeouts, retries and backoff."""
+    import httpx
+
+    connect = _setting("UPSTREAM_CONNECT_TIMEOUT", 3.05)
+    read = read_timeout or _setting("UPSTREAM_READ_TIMEOUT", 10)
+    timeout = httpx.Timeout(read, connect=connect)
+    retries = _setting("UPSTREAM_MAX_RETRIES", 3)
+    connect_retries = _setting("UPSTREAM_CONNECT_RETRIES", 1)
+    backoff_factor = _setting("UPSTREAM_BACKOFF_FACTOR", 0.5)
+
+    client = get_async_client()
+    attempt = 0
+    connect_failures = 0
+    start = time.perf_counter()
+    while True:
+        try:
+            response = await client.get(url, params=params, timeout=timeout)
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if attempt >= retries or connect_failures >= connect_retries:
+                _observe(url, start, None)
+                raise
+            connect_failures += 1
+            delay = None
+        except Exception:
+            # read timeouts and the like: not retried, as in get()
+            _observe(url, start, None)
+            raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                _observe(url, start, response)
+                return response
+            delay = _retry_after_seconds(response)
+
+        if delay is None:
+            delay = random.uniform(0, backoff_factor * (2**attempt))
+        attempt += 1
+        await asyncio.sleep(delay)
@@ -1 +1,968 @@
-# Create your tests here.
+import csv
+import heapq
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .models import GeocodedLocation, IdempotencyRecord, Trip, TripJob
+from .serializers import HOSSweepSerializer
+from .services import upstream
+from .services.circuit_breaker import CircuitBreaker
+from .services.geocode_cache import GeocodeCache, normalize_location
+from .services.geometry import (
+    decode_polyline,
+    encode_polyline,
+    parse_path_options,
+    simplify_path,
+)
+from .services.hos_calculator import calculate_hos
+from .services.hos_engine import calculate_hos_fast, resume_hos
+from .services.hos_memo import HOSMemo
+from .services.hos_sweep import sweep_hos
+from .services.idempotency import IdempotencyStore
+from .services.path_index import PathIndex
+from .services.road_graph import NoRouteError, RoadGraph, local_route
+from .services.routing import calculate_fuel_stops, haversine_miles
+
+
+class NormalizeLocationTests(SimpleTestCase):
+    def test_equivalent_spellings_share_a_key(self):
+        for location, key in (
+            ("Dallas, TX", "dallas tx"),
+            ("dallas tx", "dallas tx"),
+            ("Dallas,  TX.", "dallas tx"),
+            ("Dallas, Texas", "dallas tx"),
+            ("DALLAS TEXAS USA", "dallas tx"),
+            ("Dallas, TX, United States", "dallas tx"),
+            ("Charleston, West Virginia", "charleston wv"),
+            ("Richmond, Virginia, US", "richmond va"),
+            ("  St. Louis,\tMissouri ", "st louis mo"),
+            ("New York", "new york"),
+            ("New York, New York", "new york ny"),
+        ):
+            with self.subTest(location=location):
+                self.assertEqual(normalize_location(location), key)
+
+
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch("trips.services.lru.time.monotonic", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.cache = GeocodeCache(max_entries=8, ttl=60)
+
+    def test_normalized_keys_share_entries(self):
+        self.cache.set("Dallas, Texas", (32.7767, -96.797))
+        self.assertEqual(self.cache.get("dallas tx"), (32.7767, -96.797))
+        self.assertEqual(GeocodedLocation.objects.get().normalized_query, "dallas tx")
+
+    def test_memory_tier_expires(self):
+        self.cache.set("Dallas, TX", (32.7767, -96.797))
+        self.assertEqual(self.cache.get("Dallas, TX"), (32.7767, -96.797))
+        self.now += 61
+        # expired in memory, still fresh in the table: read back from it
+        self.assertEqual(self.cache.get("Dallas, TX"), (32.7767, -96.797))
+        stats = self.cache.stats()
+        self.assertEqual((stats["memory"]["hits"], stats["memory"]["misses"]), (1, 1))
+        self.assertEqual(stats["memory"]["evictions"], 1)
+        self.assertEqual(stats["database"], {"hits": 1, "misses": 0})
+        self.assertEqual(GeocodedLocation.objects.get().hits, 1)
+
+    def test_database_tier_expires(self):
+        self.cache.set("Dallas, TX", (32.7767, -96.797))
+        self.cache.memory.clear()
+        GeocodedLocation.objects.update(
+            updated_at=timezone.now() - timedelta(seconds=61)
+        )
+        self.assertIsNone(self.cache.get("Dallas, TX"))
+        self.assertFalse(GeocodedLocation.objects.exists())
+        self.assertEqual(self.cache.stats()["database"], {"hits": 0, "misses": 1})
+
+    def test_misses_are_counted(self):
+        self.assertIsNone(self.cache.get("Nowhere, TX"))
+        stats = self.cache.stats()
+        self.assertEqual(stats["memory"]["misses"], 1)
+        self.assertEqual(stats["database"], {"hits": 0, "misses": 1})
+
+    def test_get_or_fetch_fetches_once(self):
+        fetch = mock.Mock(return_value=(32.7767, -96.797))
+        self.cache.get_or_fetch("Dallas, TX", fetch)
+        self.cache.get_or_fetch("dallas tx", fetch)
+        fetch.assert_called_once_with("Dallas, TX")
+
+    def test_purge_expired(self):
+        self.cache.set("Dallas, TX", (32.7767, -96.797))
+        self.cache.set("Tulsa, OK", (36.154, -95.9928))
+        GeocodedLocation.objects.filter(normalized_query="dallas tx").update(
+            updated_at=timezone.now() - timedelta(seconds=61)
+        )
+        self.assertEqual(self.cache.purge_expired(), 1)
+        self.assertEqual(
+            list(GeocodedLocation.objects.values_list("normalized_query", flat=True)),
+            ["tulsa ok"],
+        )
+
+
+def hos_cases(count, seed):
+    """(trip_hours, distance, cycle_used, fuel_stops) inputs, edge cases first."""
+    cases = [
+        (0, 0, 0, []),
+        (7.75, 426.25, 0, []),
+        (7.75 * 3, 1278.75, 10, [{"mile_marker": 1000, "reason": "Fuel stop"}]),
+        (11, 605, 69.99, []),
+        (40, 2200, 70, []),
+        (55, 3025, 60, [{"mile_marker": 1000, "reason": "Fuel stop"}]),
+        (300, 16500, 0, [{"mile_marker": 1000, "reason": "Fuel stop"}]),
+    ]
+    rnd = random.Random(seed)
+    for _ in range(count):
+        hours = round(rnd.uniform(0, 150), 2)
+        distance = round(hours * rnd.uniform(30, 70), 2)
+        cycle_used = round(rnd.uniform(0, 70), 2)
+        fuel_stops = (
+            [{"mile_marker": 1000, "reason": "Fuel stop"}] if distance > 1000 else []
+        )
+        cases.append((hours, distance, cycle_used, fuel_stops))
+    return cases
+
+
+def as_json(logs):
+    # also catches int/float and key order differences
+    return json.dumps(logs)
+
+
+class HOSEngineEquivalenceTests(SimpleTestCase):
+    """The event engine must match calculate_hos exactly."""
+
+    def test_event_engine_matches_reference(self):
+        for case in hos_cases(500, seed=10):
+            with self.subTest(case=case):
+                self.assertEqual(
+                    as_json(calculate_hos_fast(*case)), as_json(calculate_hos(*case))
+                )
+
+
+def reference_sweep_cell(cycle_used, trip_hours, avg_speed_mph):
+    """(days_needed, arrival_day) for one cell, from calculate_hos."""
+    distance = trip_hours * avg_speed_mph
+    logs = calculate_hos(
+        trip_hours, distance, cycle_used, calculate_fuel_stops(distance)
+    )
+    driven = 0.0
+    for log in logs:
+        driven += log["driving_hours"]
+        if driven >= trip_hours - 1e-6:
+            return len(logs), log["day"]
+    return len(logs), 0
+
+
+class HOSSweepTests(SimpleTestCase):
+    def test_sweep_matches_reference(self):
+        rnd = random.Random(30)
+        cycle_used = [0, 10, 35.5, 56.75, 69.99, 70] + [
+            round(rnd.uniform(0, 70), 2) for _ in range(10)
+        ]
+        trip_hours = [0, 0.5, 7.75, 11, 15.5, 23.25, 60] + [
+            round(rnd.uniform(0, 120), 2) for _ in range(15)
+        ]
+        for speed in (30, 55, 70):
+            result = sweep_hos(cycle_used, trip_hours, avg_speed_mph=speed)
+            for i, cycle in enumerate(cycle_used):
+                for j, hours in enumerate(trip_hours):
+                    days, arrival = reference_sweep_cell(cycle, hours, speed)
+                    with self.subTest(speed=speed, cycle_used=cycle, hours=hours):
+                        self.assertEqual(int(result["days_needed"][i, j]), days)
+                        self.assertEqual(int(result["arrival_day"][i, j]), arrival)
+                        self.assertEqual(
+                            bool(result["cycle_exhausted"][i, j]), arrival == 0
+                        )
+
+
+class HOSResumeTests(SimpleTestCase):
+    def test_resume_from_every_day_matches_full_run(self):
+        for case in hos_cases(60, seed=20):
+            checkpoints = []
+            logs = calculate_hos_fast(*case, checkpoints=checkpoints)
+            self.assertEqual(len(checkpoints), len(logs))
+            for day, checkpoint in enumerate(checkpoints, start=1):
+                with self.subTest(case=case, day=day):
+                    resumed = [record.as_log() for record in resume_hos(checkpoint)]
+                    self.assertEqual(as_json(resumed), as_json(logs[day - 1 :]))
+
+    def test_resume_collects_the_remaining_checkpoints(self):
+        checkpoints = []
+        calculate_hos_fast(120, 6600, 0, [], checkpoints=checkpoints)
+        resumed = []
+        resume_hos(checkpoints[2], checkpoints=resumed)
+        self.assertEqual(resumed, checkpoints[2:])
+
+    def test_malformed_checkpoint(self):
+        with self.assertRaises(ValueError):
+            resume_hos({"day": 1})
+        with self.assertRaises(ValueError):
+            resume_hos({**self._checkpoint(), "day": 0})
+
+    def _checkpoint(self):
+        checkpoints = []
+        calculate_hos_fast(20, 1100, 0, [], checkpoints=checkpoints)
+        return checkpoints[0]
+
+
+class HOSMemoTests(SimpleTestCase):
+    """The memo must match the engine and stay unaffected by its callers."""
+
+    def test_memo_matches_reference(self):
+        memo = HOSMemo(max_entries=64, precision=2)
+        # repeats exercise both the miss and the hit path
+        cases = hos_cases(200, seed=11)
+        for case in cases + cases[::3]:
+            with self.subTest(case=case):
+                self.assertEqual(
+                    as_json(memo.calculate_hos(*case)), as_json(calculate_hos(*case))
+                )
+
+    def test_memo_checkpoints_match_engine(self):
+        memo = HOSMemo(max_entries=8, precision=2)
+        for case in hos_cases(20, seed=12):
+            expected, got = [], []
+            calculate_hos_fast(*case, checkpoints=expected)
+            memo.calculate_hos(*case)  # cached without a checkpoint list
+            memo.calculate_hos(*case, checkpoints=got)
+            with self.subTest(case=case):
+                self.assertEqual(got, expected)
+
+    def test_mutating_a_result_does_not_poison_the_memo(self):
+        memo = HOSMemo(max_entries=8, precision=2)
+        args = (30, 1650, 12.5, [{"mile_marker": 1000, "reason": "Fuel stop"}])
+        expected = as_json(calculate_hos(*args))
+
+        first = memo.calculate_hos(*args)
+        first[0]["activities"][0]["type"] = "TAMPERED"
+        first[0]["activities"].clear()
+        first[0]["driving_hours"] = -1
+        first.pop()
+
+        checkpoints = []
+        memo.calculate_hos(*args, checkpoints=checkpoints)
+        checkpoints[0]["remaining_trip_hours"] = -1
+
+        self.assertEqual(as_json(memo.calculate_hos(*args)), expected)
+        again = []
+        memo.calculate_hos(*args, checkpoints=again)
+        self.assertNotEqual(again[0]["remaining_trip_hours"], -1)
+
+    def test_inputs_are_quantized(self):
+        memo = HOSMemo(max_entries=8, precision=2)
+        memo.calculate_hos(10.001, 550.004, 5, [])
+        memo.calculate_hos(10.004, 549.996, 5.001, [])
+        self.assertEqual(memo.stats()["size"], 1)
+
+
+class HOSSweepValidationTests(SimpleTestCase):
+    def errors(self, trip_hours):
+        serializer = HOSSweepSerializer(data={"trip_hours": trip_hours})
+        self.assertFalse(serializer.is_valid())
+        return serializer.errors["trip_hours"]
+
+    def test_grids(self):
+        for data, expected in (
+            ([0, 5.5, "11"], [0.0, 5.5, 11.0]),
+            ({"stop": 2}, [0.0, 1.0, 2.0]),
+            ({"start": 1, "stop": 2, "step": 0.5}, [1.0, 1.5, 2.0]),
+        ):
+            with self.subTest(data=data):
+                serializer = HOSSweepSerializer(data={"trip_hours": data})
+                self.assertTrue(serializer.is_valid(), serializer.errors)
+                self.assertEqual(serializer.validated_data["trip_hours"], expected)
+
+    def test_non_finite_values_are_invalid(self):
+        for data in (
+            {"stop": "inf"},
+            {"stop": "nan"},
+            {"start": "-inf", "stop": 5},
+            {"stop": 5, "step": "nan"},
+            {"stop": 10**400},
+            ["nan"],
+            [1, "inf"],
+            [10**400],
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(self.errors(data)[0].code, "invalid")
+
+    def test_tiny_steps_are_too_many(self):
+        for step in (1e-3, 1e-320):
+            with self.subTest(step=step):
+                errors = self.errors({"stop": 70, "step": step})
+                self.assertEqual(errors[0].code, "too_many")
+
+    def test_view_answers_400(self):
+        response = self.client.post(
+            "/api/trips/hos/sweep/",
+            {"trip_hours": {"stop": "inf"}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("trip_hours", response.json())
+
+
+def linear_walk(path, mile):
+    """The map's original per-stop walk along the path (findPointAtMile)."""
+    if mile <= 0:
+        return path[0]
+    cumulative = [0.0]
+    for a, b in zip(path, path[1:]):
+        cumulative.append(cumulative[-1] + haversine_miles(*a, *b))
+    for i in range(1, len(cumulative)):
+        if cumulative[i] >= mile:
+            prev = cumulative[i - 1]
+            ratio = (mile - prev) / (cumulative[i] - prev or 1)
+            return [
+                path[i - 1][0] + (path[i][0] - path[i - 1][0]) * ratio,
+                path[i - 1][1] + (path[i][1] - path[i - 1][1]) * ratio,
+            ]
+    return path[-1]
+
+
+class PathIndexTests(SimpleTestCase):
+    def setUp(self):
+        rnd = random.Random(40)
+        lat, lon = 32.7767, -96.797
+        self.path = [[lat, lon]]
+        for i in range(300):
+            if i % 50 == 7:
+                self.path.append(list(self.path[-1]))  # zero-length segment
+                continue
+            lat += rnd.uniform(-0.02, 0.05)
+            lon += rnd.uniform(-0.02, 0.05)
+            self.path.append([lat, lon])
+        self.index = PathIndex(self.path)
+
+    def assertSamePoint(self, got, expected):
+        self.assertAlmostEqual(got[0], expected[0], places=5)
+        self.assertAlmostEqual(got[1], expected[1], places=5)
+
+    def test_matches_linear_walk(self):
+        length = self.index.length_miles
+        miles = [length * k / 97 for k in range(98)]
+        for mile, got in zip(miles, self.index.locate_many(miles)):
+            with self.subTest(mile=mile):
+                self.assertSamePoint(got, linear_walk(self.path, mile))
+
+    def test_zero_length_segments(self):
+        cumulative = self.index.cumulative
+        for i in range(1, len(self.path)):
+            if self.path[i] == self.path[i - 1]:
+                mile = float(cumulative[i])
+                with self.subTest(point=i):
+                    self.assertSamePoint(self.index.locate(mile), self.path[i])
+                    self.assertSamePoint(
+                        self.index.locate(mile), linear_walk(self.path, mile)
+                    )
+
+    def test_endpoints_clamp(self):
+        length = self.index.length_miles
+        for mile, expected in (
+            (0, self.path[0]),
+            (-5, self.path[0]),
+            (length, self.path[-1]),
+            (length + 100, self.path[-1]),
+        ):
+            with self.subTest(mile=mile):
+                self.assertSamePoint(self.index.locate(mile), expected)
+                self.assertSamePoint(
+                    self.index.locate(mile), linear_walk(self.path, mile)
+                )
+
+    def test_route_miles_are_scaled_onto_the_path(self):
+        index = PathIndex(self.path, total_miles=self.index.length_miles * 1.2)
+        self.assertSamePoint(index.locate(self.index.length_miles * 1.2), self.path[-1])
+        self.assertSamePoint(
+            index.locate(self.index.length_miles * 0.6),
+            self.index.locate(self.index.length_miles * 0.5),
+        )
+
+    def test_empty_and_single_point_paths(self):
+        self.assertIsNone(PathIndex([]).locate(10))
+        self.assertSamePoint(PathIndex([[35.0, -97.0]]).locate(10), [35.0, -97.0])
+
+
+def segment_distance(point, a, b, kx):
+    """Distance from point to segment a-b, in degrees, longitude scaled by kx."""
+    px, py = point[1] * kx, point[0]
+    ax, ay, bx, by = a[1] * kx, a[0], b[1] * kx, b[0]
+    dx, dy = bx - ax, by - ay
+    t = 0.0
+    if dx or dy:
+        t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+class GeometryTests(SimpleTestCase):
+    def random_path(self, count, seed):
+        rnd = random.Random(seed)
+        lat, lon = 32.7767, -96.797
+        path = [[lat, lon]]
+        for _ in range(count - 1):
+            lat += rnd.uniform(-0.01, 0.02)
+            lon += rnd.uniform(-0.01, 0.02)
+            path.append([round(lat, 6), round(lon, 6)])
+        return path
+
+    def test_reference_polyline(self):
+        # Google's example from the Encoded Polyline Algorithm Format docs
+        points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+        encoded = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+        self.assertEqual(encode_polyline(points), encoded)
+        for got, expected in zip(decode_polyline(encoded), points):
+            self.assertAlmostEqual(got[0], expected[0], places=5)
+            self.assertAlmostEqual(got[1], expected[1], places=5)
+
+    def test_round_trips(self):
+        path = self.random_path(500, seed=60)
+        for precision in (5, 6):
+            decoded = decode_polyline(encode_polyline(path, precision), precision)
+            # coordinates are rounded to `precision` decimal places
+            delta = 0.5 * 10**-precision + 1e-12
+            with self.subTest(precision=precision):
+                self.assertEqual(len(decoded), len(path))
+                for got, expected in zip(decoded, path):
+                    self.assertAlmostEqual(got[0], expected[0], delta=delta)
+                    self.assertAlmostEqual(got[1], expected[1], delta=delta)
+        self.assertEqual(decode_polyline(encode_polyline([])), [])
+
+    def test_simplify_keeps_endpoints_within_tolerance(self):
+        path = self.random_path(600, seed=61)
+        kx = math.cos(math.radians(sum(p[0] for p in path) / len(path)))
+        for tolerance in (0.0005, 0.005, 0.05):
+            simplified = simplify_path(path, tolerance)
+            with self.subTest(tolerance=tolerance):
+                self.assertLess(len(simplified), len(path))
+                self.assertEqual(simplified[0], path[0])
+                self.assertEqual(simplified[-1], path[-1])
+                for point in path:
+                    nearest = min(
+                        segment_distance(point, a, b, kx)
+                        for a, b in zip(simplified, simplified[1:])
+                    )
+                    self.assertLessEqual(nearest, tolerance + 1e-9)
+        self.assertEqual(simplify_path(path[:2], 1), path[:2])
+        self.assertEqual(simplify_path(path, 0), path)
+
+    def test_bad_path_options(self):
+        for query, message in (
+            ({"simplify": "nan"}, "finite"),
+            ({"simplify": "inf"}, "finite"),
+            ({"simplify": "-0.1"}, "negative"),
+            ({"simplify": "a"}, "number"),
+            ({"simplify": "0.01", "zoom": "5"}, "either"),
+            ({"zoom": "23"}, "between"),
+            ({"zoom": "1.5"}, "integer"),
+            ({"path_format": "geojson"}, "path_format"),
+        ):
+            with self.subTest(query=query):
+                with self.assertRaisesMessage(ValueError, message):
+                    parse_path_options(query)
+
+    def test_bad_path_options_answer_400(self):
+        for query in ("?simplify=nan", "?simplify=inf", "?simplify=0.01&zoom=5"):
+            with self.subTest(query=query):
+                response = self.client.post(
+                    "/api/trips/create/" + query, {}, content_type="application/json"
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    self.client.get("/api/trips/1/" + query).status_code, 400
+                )
+
+
+def dijkstra_seconds(graph, source, target):
+    """Plain Dijkstra over a RoadGraph's CSR arrays; None if unreachable."""
+    best = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        seconds, u = heapq.heappop(heap)
+        if u == target:
+            return seconds
+        if seconds > best[u]:
+            continue
+        for edge in range(graph.indptr[u], graph.indptr[u + 1]):
+            v = graph.indices[edge]
+            candidate = seconds + graph.duration_s[edge]
+            if candidate < best.get(v, float("inf")):
+                best[v] = candidate
+                heapq.heappush(heap, (candidate, v))
+    return None
+
+
+class RoadGraphTests(SimpleTestCase):
+    SIZE = 12  # nodes per side of the grid
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rnd = random.Random(50)
+        cls.tmp = tempfile.TemporaryDirectory()
+        nodes_path = os.path.join(cls.tmp.name, "nodes.csv")
+        edges_path = os.path.join(cls.tmp.name, "edges.csv")
+        with open(nodes_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "lat", "lon"])
+            for i in range(cls.SIZE):
+                for j in range(cls.SIZE):
+                    lat = 35 + i * 0.05 + rnd.uniform(-0.01, 0.01)
+                    lon = -100 + j * 0.06 + rnd.uniform(-0.01, 0.01)
+                    writer.writerow([f"n{i}_{j}", lat, lon])
+            writer.writerow(["island", 35.3, -99.7])  # no edges
+        with open(edges_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["source", "target", "length_m", "duration_s", "oneway"])
+            for i in range(cls.SIZE):
+                for j in range(cls.SIZE):
+                    for di, dj in ((0, 1), (1, 0)):
+                        if i + di < cls.SIZE and j + dj < cls.SIZE:
+                            length = rnd.uniform(5000, 9000)
+                            speed = rnd.choice([15, 25, 30])
+                            oneway = "yes" if rnd.random() < 0.2 else ""
+                            writer.writerow(
+                                [f"n{i}_{j}", f"n{i + di}_{j + dj}"]
+                                + [round(length, 1), round(length / speed, 1), oneway]
+                            )
+        cls.graph = RoadGraph.from_csv(nodes_path, edges_path)
+        cls.island = cls.graph.node_count - 1
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def test_shortest_path_matches_dijkstra(self):
+        graph = self.graph
+        rnd = random.Random(51)
+        for _ in range(200):
+            source = rnd.randrange(self.island)
+            target = rnd.randrange(self.island)
+            expected = dijkstra_seconds(graph, source, target)
+            with self.subTest(source=source, target=target):
+                if expected is None:
+                    with self.assertRaises(NoRouteError):
+                        graph.shortest_path(source, target)
+                    continue
+                nodes, length, duration = graph.shortest_path(source, target)
+                self.assertAlmostEqual(duration, expected, places=6)
+                self.assertEqual((nodes[0], nodes[-1]), (source, target))
+                # the nodes are joined by edges adding up to the duration
+                total = 0.0
+                for u, v in zip(nodes, nodes[1:]):
+                    edges = range(graph.indptr[u], graph.indptr[u + 1])
+                    total += min(
+                        graph.duration_s[e] for e in edges if graph.indices[e] == v
+                    )
+                self.assertAlmostEqual(total, duration, places=6)
+
+    def test_unconnected_nodes(self):
+        with self.assertRaises(NoRouteError):
+            self.graph.shortest_path(0, self.island)
+        self.assertEqual(self.graph.shortest_path(3, 3), ([3], 0.0, 0.0))
+
+    def test_route_shape(self):
+        points = [(35.0, -100.0), (35.2, -99.8), (35.5, -99.4)]
+        distance, duration, path, waypoints = self.graph.route(points)
+        self.assertGreater(distance, 0)
+        self.assertGreater(duration, 0)
+        self.assertEqual(len(waypoints), len(points))
+        self.assertEqual(path[0], waypoints[0])
+        self.assertEqual(path[-1], waypoints[-1])
+        self.assertIn(waypoints[1], path)
+        for point in path:
+            self.assertEqual(len(point), 2)
+
+    def test_points_too_far_from_the_graph(self):
+        far = [(35.0, -100.0), (40.0, -90.0)]
+        with self.assertRaises(NoRouteError):
+            self.graph.route(far, max_snap_m=25 * 1609.34)
+        self.graph.route(far[:1] + [(35.2, -99.8)], max_snap_m=25 * 1609.34)
+
+    def test_saved_graph_routes_the_same(self):
+        path = os.path.join(self.tmp.name, "graph.npz")
+        self.graph.save(path)
+        points = [(35.0, -100.0), (35.5, -99.4)]
+        self.assertEqual(RoadGraph.load(path).route(points), self.graph.route(points))
+
+    def test_local_route_without_a_graph(self):
+        with override_settings(ROAD_GRAPH_PATH=None):
+            with self.assertRaises(NoRouteError):
+                local_route([(35.0, -100.0), (35.5, -99.4)])
+
+
+LOCATIONS = {
+    "Dallas, TX": (32.7767, -96.797),
+    "Oklahoma City, OK": (35.4676, -97.5164),
+    "New York, NY": (40.7128, -74.006),
+}
+
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self._data = data
+        self.status_code = status_code
+        self.headers = {}
+
+    def json(self):
+        return self._data
+
+
+def fake_upstream_get(url, params=None, read_timeout=None):
+    """Nominatim from LOCATIONS; OSRM as straight lines at 50 mph."""
+    if "nominatim" in url:
+        lat, lon = LOCATIONS[params["q"]]
+        return FakeResponse([{"lat": str(lat), "lon": str(lon)}])
+    points = [
+        [float(v) for v in point.split(",")]
+        for point in url.rsplit("/", 1)[1].split(";")
+    ]
+    coordinates = []
+    for (lon1, lat1), (lon2, lat2) in zip(points, points[1:]):
+        for i in range(50):
+            coordinates.append(
+                [lon1 + (lon2 - lon1) * i / 50, lat1 + (lat2 - lat1) * i / 50]
+            )
+    coordinates.append(points[-1])
+    meters = 1609.34 * sum(
+        haversine_miles(lat1, lon1, lat2, lon2)
+        for (lon1, lat1), (lon2, lat2) in zip(points, points[1:])
+    )
+    return FakeResponse(
+        {
+            "code": "Ok",
+            "routes": [
+                {
+                    "distance": meters,
+                    "duration": meters / 1609.34 / 50 * 3600,
+                    "geometry": {"coordinates": coordinates},
+                }
+            ],
+            "waypoints": [{"location": point} for point in points],
+        }
+    )
+
+
+TRIP = {
+    "current_location": "Dallas, TX",
+    "pickup_location": "Oklahoma City, OK",
+    "dropoff_location": "New York, NY",
+    "current_cycle_used_hours": 10,
+}
+
+
+LOCMEM_CACHES = {
+    # distinct LOCATIONs: locmem caches with the same one share entries
+    alias: {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": alias,
+    }
+    for alias in ("default", "routes", "breaker")
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TripAPITestCase(TransactionTestCase):
+    """Requests against the API with upstream (Nominatim, OSRM) faked."""
+
+    def setUp(self):
+        patcher = mock.patch.object(upstream, "get", side_effect=fake_upstream_get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, data=TRIP, query="", **extra):
+        return self.client.post(
+            "/api/trips/create/" + query, data, content_type="application/json", **extra
+        )
+
+
+class StreamedCreateTests(TripAPITestCase):
+    def test_lines_match_the_stored_plan(self):
+        response = self.create(query="?stream=ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in response.streaming_content]
+
+        head, days, end = lines[0], lines[1:-1], lines[-1]
+        self.assertEqual(head["type"], "route_info")
+        self.assertEqual([line["type"] for line in days], ["day"] * len(days))
+        self.assertEqual(end, {"type": "end", "days": len(days)})
+
+        stored = self.client.get(f"/api/trips/{head['trip']['id']}/").json()
+        self.assertEqual([line["log"] for line in days], stored["hos_logs"])
+        self.assertEqual(
+            [stop for line in days for stop in line["rest_stops"]],
+            stored["route_info"]["rest_stops"],
+        )
+
+    def test_plan_is_stored_when_the_client_disconnects(self):
+        response = self.create(query="?stream=ndjson")
+        head = json.loads(next(iter(response.streaming_content)))
+        response.close()  # what the server does when the client goes away
+        detail = self.client.get(f"/api/trips/{head['trip']['id']}/")
+        self.assertEqual(detail.status_code, 200)
+        self.assertGreater(len(detail.json()["hos_logs"]), 1)
+
+
+class CompressionTests(TripAPITestCase):
+    def test_large_responses_are_gzipped(self):
+        response = self.create(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_streams_are_not_compressed(self):
+        response = self.create(query="?stream=ndjson", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json.loads(chunks[0])["type"], "route_info")
+        self.assertEqual(json.loads(chunks[-1])["type"], "end")
+
+
+class IdempotencyTests(TripAPITestCase):
+    def test_key_replays_the_stored_plan(self):
+        first = self.create(HTTP_IDEMPOTENCY_KEY="k1")
+        second = self.create(HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json()["trip"], first.json()["trip"])
+        self.assertEqual(second.json()["hos_logs"], first.json()["hos_logs"])
+        self.assertEqual(Trip.objects.count(), 1)
+        # only the trip is recorded; the plan is read back from TripPlan
+        record = IdempotencyRecord.objects.get()
+        self.assertEqual(record.trip_id, first.json()["trip"]["id"])
+        self.assertIsNone(record.response)
+
+    def test_replays_are_shaped_by_the_query(self):
+        self.create(HTTP_IDEMPOTENCY_KEY="k1", query="?path_format=polyline")
+        second = self.create(HTTP_IDEMPOTENCY_KEY="k1", query="?path_format=polyline")
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertIsInstance(second.json()["route_info"]["path"], str)
+
+    def test_key_reused_with_another_body(self):
+        self.create(HTTP_IDEMPOTENCY_KEY="k1")
+        other = dict(TRIP, current_cycle_used_hours=20)
+        response = self.create(other, HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Trip.objects.count(), 1)
+
+    def test_errors_are_replayed_as_recorded(self):
+        invalid = dict(TRIP, current_cycle_used_hours="many")
+        first = self.create(invalid, HTTP_IDEMPOTENCY_KEY="k1")
+        second = self.create(invalid, HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(second.status_code, 400)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second.json(), first.json())
+
+    def test_double_click_is_caught_until_the_fingerprint_expires(self):
+        self.create()
+        self.assertEqual(self.create()["Idempotent-Replayed"], "true")
+        IdempotencyRecord.objects.update(expires_at=timezone.now())
+        self.assertFalse(self.create().has_header("Idempotent-Replayed"))
+        self.assertEqual(Trip.objects.count(), 2)
+
+    def test_keys_are_scoped_per_client(self):
+        self.create(HTTP_IDEMPOTENCY_KEY="k1", HTTP_X_FORWARDED_FOR="10.0.0.1")
+        response = self.create(
+            HTTP_IDEMPOTENCY_KEY="k1", HTTP_X_FORWARDED_FOR="10.0.0.2"
+        )
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(Trip.objects.count(), 2)
+
+    def test_second_claimant_waits_for_the_stored_response(self):
+        def request():
+            return Request(
+                APIRequestFactory().post(
+                    "/api/trips/create/", TRIP, format="json", HTTP_IDEMPOTENCY_KEY="k1"
+                ),
+                parsers=[JSONParser()],
+            )
+
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 400, {"detail": "computed once"}, None
+
+        # separate stores: they only share the database, like two workers
+        first = threading.Thread(
+            target=IdempotencyStore().run, args=(request(), compute, None)
+        )
+        first.start()
+        started.wait(5)
+        waiter = threading.Timer(0.3, release.set)
+        waiter.start()
+        result = IdempotencyStore().run(request(), compute, None)
+        first.join()
+        waiter.join()
+
+        self.assertEqual(result, (400, {"detail": "computed once"}, True))
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    TEST_BREAKER_FAILURE_THRESHOLD=3,
+    TEST_BREAKER_SLOW_CALL_SECONDS=1,
+    TEST_BREAKER_RESET_TIMEOUT=30,
+)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch("trips.services.circuit_breaker.time.time", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.breaker = CircuitBreaker("test")
+        self.breaker.cache.clear()
+
+    def record_failures(self, times=1):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_at_the_failure_threshold(self):
+        self.record_failures(2)
+        self.assertEqual(self.breaker.state(), "closed")
+        self.assertTrue(self.breaker.allow())
+        self.record_failures()
+        self.assertEqual(self.breaker.state(), "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_count(self):
+        self.record_failures(2)
+        self.breaker.record_success(0.1)
+        self.record_failures(2)
+        self.assertEqual(self.breaker.state(), "closed")
+        self.assertEqual(self.breaker.stats()["failures"], 2)
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(3):
+            self.breaker.record_success(1.5)
+        self.assertEqual(self.breaker.state(), "open")
+
+    def test_half_open_lets_one_probe_through(self):
+        self.record_failures(3)
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 2
+        self.assertEqual(self.breaker.state(), "half_open")
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_probe_success_closes(self):
+        self.record_failures(3)
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.state(), "closed")
+        self.assertEqual(self.breaker.stats()["failures"], 0)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens_for_another_period(self):
+        self.record_failures(3)
+        self.now += 31
+        self.assertTrue(self.breaker.allow())
+        self.record_failures()
+        self.assertEqual(self.breaker.state(), "open")
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+        self.now += 2
+        self.assertTrue(self.breaker.allow())
+
+    def test_state_is_kept_apart_from_routes(self):
+        self.record_failures(3)
+        caches["routes"].clear()
+        self.assertEqual(self.breaker.state(), "open")
+
+
+class TripJobTests(TripAPITestCase):
+    def wait_for(self, url):
+        deadline = time.monotonic() + 10
+        while True:
+            data = self.client.get(url).json()
+            if data["status"] in (TripJob.SUCCEEDED, TripJob.FAILED):
+                return data
+            self.assertLess(time.monotonic(), deadline, "job did not finish")
+            time.sleep(0.05)
+
+    def events(self, job_id):
+        response = self.client.get(f"/api/trips/jobs/{job_id}/events/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = []
+        for chunk in response.streaming_content:
+            event, data = chunk.decode().strip().split("\n")
+            events.append((event[len("event: ") :], json.loads(data[len("data: ") :])))
+        return events
+
+    def stale_job(self, status):
+        job = TripJob.objects.create(trip=Trip.objects.create(**TRIP), status=status)
+        TripJob.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=301)
+        )
+        return job
+
+    def test_job_runs_to_the_stored_plan(self):
+        response = self.create(query="?mode=job")
+        self.assertEqual(response.status_code, 202)
+        queued = response.json()
+
+        done = self.wait_for(queued["status_url"])
+        self.assertEqual(done["status"], TripJob.SUCCEEDED)
+        self.assertEqual(done["progress"], 100)
+        stored = self.client.get(f"/api/trips/{queued['trip']['id']}/").json()
+        self.assertEqual(done["result"]["hos_logs"], stored["hos_logs"])
+
+        [(event, data)] = self.events(queued["job_id"])
+        self.assertEqual(event, "done")
+        self.assertEqual(data["result"]["hos_logs"], stored["hos_logs"])
+
+    def test_failed_planning_fails_the_job(self):
+        with mock.patch(
+            "trips.services.jobs.plan_trip", side_effect=ValueError("no route")
+        ), self.assertLogs("trips.services.jobs", "ERROR"):
+            response = self.create(query="?mode=job")
+            failed = self.wait_for(response.json()["status_url"])
+        self.assertEqual(failed["status"], TripJob.FAILED)
+        self.assertEqual(failed["error"], "no route")
+
+    def test_stale_jobs_are_reported_failed(self):
+        for status in (TripJob.QUEUED, TripJob.RUNNING):
+            job = self.stale_job(status)
+            with self.subTest(status=status), self.assertLogs("trips.services.jobs"):
+                data = self.client.get(f"/api/trips/jobs/{job.pk}/").json()
+                self.assertEqual(data["status"], TripJob.FAILED)
+                self.assertIn("interrupted", data["error"])
+
+    def test_events_end_when_the_job_went_stale(self):
+        job = self.stale_job(TripJob.RUNNING)
+        with self.assertLogs("trips.services.jobs"):
+            [(event, data)] = self.events(job.pk)
+        self.assertEqual(event, "error")
+        self.assertEqual(data["status"], TripJob.FAILED)
+
+    def test_recently_updated_jobs_are_left_running(self):
+        job = TripJob.objects.create(
+            trip=Trip.objects.create(**TRIP), status=TripJob.RUNNING
+        )
+        data = self.client.get(f"/api/trips/jobs/{job.pk}/").json()
+        self.assertEqual(data["status"], TripJob.RUNNING)
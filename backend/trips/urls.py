@@ -1,6 +1,32 @@
 from django.urls import path
-from .views import TripCreateView
+from .views import (
+    TripCreateView,
+    TripCreateAsyncView,
+    TripBatchCreateView,
+    TripDetailView,
+    TripHistoryView,
+    TripReplanView,
+    TripJobDetailView,
+    TripJobEventsView,
+    HOSSweepView,
+    LocationAutocompleteView,
+    CacheStatsView,
+)
 
 urlpatterns = [
     path("create/", TripCreateView.as_view()),
+    path("create/async/", TripCreateAsyncView.as_view()),
+    path("batch/", TripBatchCreateView.as_view()),
+    path("history/", TripHistoryView.as_view()),
+    path("<int:pk>/", TripDetailView.as_view()),
+    path("<int:pk>/replan/", TripReplanView.as_view()),
+    path("jobs/<uuid:job_id>/", TripJobDetailView.as_view(), name="trip-job-detail"),
+    path(
+        "jobs/<uuid:job_id>/events/",
+        TripJobEventsView.as_view(),
+        name="trip-job-events",
+    ),
+    path("hos/sweep/", HOSSweepView.as_view()),
+    path("geocode/autocomplete/", LocationAutocompleteView.as_view()),
+    path("cache/stats/", CacheStatsView.as_view()),
 ]
@@ -1,139 +1,699 @@
+import hashlib
+import json
+from datetime import datetime, time
+
 from rest_framework.views import APIView
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework import status
-from datetime import timedelta
+from django.conf import settings
+from django.db.models import F, Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
 
-from .serializers import TripSerializer
-from .services.routing import calculate_route, calculate_fuel_stops
-from .services.hos_calculator import calculate_hos
+from .models import Trip, TripJob, TripPlan
+from .renderers import dumps
+from .serializers import (
+    HOSSweepSerializer,
+    ReplanSerializer,
+    TripHistorySerializer,
+    TripSerializer,
+)
+from .services.planner import (
+    aplan_trip,
+    iter_trip_plan,
+    plan_trip,
+    plan_trips,
+    replan_trip,
+)
+from .services.circuit_breaker import osrm_breaker
+from .services.gazetteer import MAX_SUGGESTIONS, get_gazetteer
+from .services.geocode_cache import geocode_cache
+from .services.geometry import apply_path_options, parse_path_options
+from .services.hos_format import apply_hos_format, format_hos_log, parse_hos_format
+from .services.hos_memo import hos_memo
+from .services.idempotency import IdempotencyConflict, idempotency_store
+from .services.jobs import (
+    fail_if_stale,
+    iter_job_events,
+    job_status,
+    submit_trip_job,
+)
+from .services import metrics
+from .services.metrics import span
+from .services.route_cache import route_cache
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.utils.decorators import method_decorator
 
 @method_decorator(csrf_exempt, name="dispatch")
 class TripCreateView(APIView):
     def post(self, request):
+        try:
+            options = _parse_options(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        mode = request.query_params.get("mode", "sync")
+        if mode not in ("sync", "job"):
+            return Response(
+                {"detail": "mode must be one of: sync, job."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        stream = request.query_params.get("stream")
+        if stream not in (None, "ndjson"):
+            return Response(
+                {"detail": "stream must be: ndjson."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if stream and mode != "sync":
+            return Response(
+                {"detail": "stream is only supported with mode=sync."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if stream:
+            # a stream can't be replayed, so it is never de-duplicated
+            serializer = TripSerializer(data=request.data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return _stream_plan(serializer.save(), options)
+
+        try:
+            status_code, data, replayed = idempotency_store.run(
+                request,
+                lambda: self._create(request, mode, options),
+                lambda trip_id: self._created(trip_id, options),
+            )
+        except IdempotencyConflict as e:
+            return Response(
+                {"detail": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+
+        response = Response(data, status=status_code)
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        if status_code == status.HTTP_201_CREATED:
+            # the ETag GET /api/trips/<id>/ will answer with, for revalidation
+            etag = _plan_etag(request, data["trip"]["id"])
+            if etag:
+                response["ETag"] = etag
+        return response
+
+    def _create(self, request, mode, options):
+        """
+        (status, data, trip) of the create response; trip is set when data
+        can be rebuilt by _created().
+        """
         serializer = TripSerializer(data=request.data)
         if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return status.HTTP_400_BAD_REQUEST, serializer.errors, None
 
         trip = serializer.save()
 
-        distance, duration, path, waypoints = calculate_route(
-            trip.current_location, trip.pickup_location, trip.dropoff_location
-        )
+        if mode == "job":
+            job = submit_trip_job(trip)
+            data = {
+                "message": "Trip planning queued",
+                "trip": TripSerializer(trip).data,
+                **job_status(job),
+                "status_url": reverse("trip-job-detail", args=[job.pk]),
+                "events_url": reverse("trip-job-events", args=[job.pk]),
+            }
+            return status.HTTP_202_ACCEPTED, data, None
+
+        checkpoints = []
+        plan = plan_trip(trip, checkpoints=checkpoints)
+        with span("db"):
+            TripPlan.from_plan(trip, plan, checkpoints).save()
+        _shape_plan(plan, options)
+
+        data = {
+            "message": "Trip created successfully",
+            "trip": TripSerializer(trip).data,
+            **plan,
+        }
+        return status.HTTP_201_CREATED, data, trip
+
+    def _created(self, trip_id, options):
+        """The create response of a planned trip, from its stored plan."""
+        trip_plan = TripPlan.objects.select_related("trip").get(trip_id=trip_id)
+        return {
+            "message": "Trip created successfully",
+            "trip": TripSerializer(trip_plan.trip).data,
+            **_shape_plan(trip_plan.as_plan(), options),
+        }
+
+
+def _parse_options(query_params):
+    """
+    Response shaping options: parse_path_options() plus "hos_format".
+    Raises ValueError with a client-facing message on bad input.
+    """
+    options = parse_path_options(query_params)
+    options["hos_format"] = parse_hos_format(query_params)
+    return options
+
 
-        fuel_stops = calculate_fuel_stops(distance)
+def _shape_plan(plan, options):
+    """Apply _parse_options() to a plan's route_info and hos_logs in place."""
+    apply_path_options(plan["route_info"], options)
+    apply_hos_format(plan["hos_logs"], options["hos_format"])
+    return plan
 
-        hos_logs = calculate_hos(
-            total_trip_hours=duration,
-            total_distance_miles=distance,
-            current_cycle_used_hours=trip.current_cycle_used_hours,
-            fuel_stops=fuel_stops,
+
+def _plan_etag(request, pk):
+    """
+    Strong ETag for a trip's stored plan as served with this request's
+    response options; changes whenever the plan is saved. None if there is
+    no plan (or the options are invalid and the view will answer 400).
+    """
+    try:
+        options = _parse_options(request.GET)
+    except ValueError:
+        return None
+    updated_at = (
+        TripPlan.objects.filter(trip_id=pk).values_list("updated_at", flat=True).first()
+    )
+    if updated_at is None:
+        return None
+    raw = f"{pk}:{updated_at.isoformat()}:{sorted(options.items())}"
+    return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _stream_plan(trip, options):
+    """
+    NDJSON variant of the create response (?stream=ndjson): a
+    "route_info" line with the trip and route, one "day" line per HOS day
+    (with that day's rest stops), then an "end" line. Each line is
+    serialized only when it is sent, so the client can render the route
+    before the days arrive and never parses one large document.
+
+    The plan is complete and stored before the response starts, so a
+    client that disconnects midway still leaves the trip with its plan.
+    Enriching the days costs little next to routing and HOS, which have
+    to run first anyway.
+    """
+    checkpoints = []
+    events = iter_trip_plan(trip, checkpoints=checkpoints)
+    # Routing and HOS run here, before the response starts, so upstream
+    # failures surface exactly as for the non-streaming response.
+    _, route_info = next(events)
+    days = [(enriched, rest_stops) for _, enriched, rest_stops in events]
+    for _, rest_stops in days:
+        route_info["rest_stops"].extend(rest_stops)
+    plan = {"route_info": route_info, "hos_logs": [log for log, _ in days]}
+    with span("db"):
+        TripPlan.from_plan(trip, plan, checkpoints).save()
+
+    def lines():
+        head = {k: v for k, v in route_info.items() if k != "rest_stops"}
+        apply_path_options(head, options)
+        yield _ndjson(
+            {
+                "type": "route_info",
+                "message": "Trip created successfully",
+                "trip": TripSerializer(trip).data,
+                "route_info": head,
+            }
         )
+        for enriched, rest_stops in days:
+            log = format_hos_log(enriched, options["hos_format"])
+            yield _ndjson({"type": "day", "log": log, "rest_stops": rest_stops})
+        yield _ndjson({"type": "end", "days": len(days)})
+
+    response = StreamingHttpResponse(
+        lines(),
+        content_type="application/x-ndjson",
+        status=status.HTTP_201_CREATED,
+    )
+    response["X-Accel-Buffering"] = "no"
+    return response
 
-        avg_speed = (distance / duration) if duration > 0 else 55.0
 
-        enriched_logs = []
-        base_date = trip.created_at.date()
-        total_days = len(hos_logs)
-        cumulative_miles_before = 0.0
-        rest_stops = []
+def _ndjson(data):
+    return dumps(data) + b"\n"
 
-        for entry in hos_logs:
-            day_index = entry["day"] - 1
-            the_date = base_date + timedelta(days=day_index)
 
-            if entry["day"] == 1:
-                _from = trip.current_location
+@method_decorator(csrf_exempt, name="dispatch")
+class TripCreateAsyncView(View):
+    """
+    ASGI-native variant of TripCreateView: upstream calls are awaited
+    concurrently and the Trip row is written through the async ORM, so
+    a worker is never blocked on Nominatim/OSRM.
+    """
+
+    async def post(self, request):
+        try:
+            options = _parse_options(request.GET)
+        except ValueError as e:
+            return JsonResponse({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse(
+                {"detail": "Invalid JSON body."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = TripSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        trip = await Trip.objects.acreate(**serializer.validated_data)
+
+        checkpoints = []
+        plan = await aplan_trip(trip, checkpoints=checkpoints)
+        with span("db"):
+            await TripPlan.from_plan(trip, plan, checkpoints).asave()
+        _shape_plan(plan, options)
+
+        with span("render"):
+            return HttpResponse(
+                dumps(
+                    {
+                        "message": "Trip created successfully",
+                        "trip": TripSerializer(trip).data,
+                        **plan,
+                    }
+                ),
+                content_type="application/json",
+                status=status.HTTP_201_CREATED,
+            )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class TripBatchCreateView(APIView):
+    """
+    Plan a list of trips in one request. Accepts {"trips": [...]} (or a
+    bare list) of create payloads; every valid trip is stored with a
+    single bulk insert and the response carries one result per item,
+    in input order, each with its own status.
+    """
+
+    def post(self, request):
+        try:
+            options = _parse_options(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get("trips")
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "Expected a non-empty list of trips."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_items = getattr(settings, "BATCH_PLANNING_MAX_ITEMS", 500)
+        if len(items) > max_items:
+            return Response(
+                {"detail": f"A batch may contain at most {max_items} trips."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = [None] * len(items)
+        pending = []
+        for index, item in enumerate(items):
+            serializer = TripSerializer(data=item)
+            if serializer.is_valid():
+                pending.append((index, Trip(**serializer.validated_data)))
             else:
-                _from = "Enroute"
+                results[index] = {
+                    "index": index,
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": serializer.errors,
+                }
 
-            if entry["day"] == total_days:
-                _to = trip.dropoff_location
-            elif entry["day"] == 1 and entry.get("miles_driven", 0.0) == 0:
-                _to = trip.pickup_location
+        trips = Trip.objects.bulk_create([trip for _, trip in pending])
+        checkpoints = []
+        plans = plan_trips(trips, checkpoints=checkpoints)
+        with span("db"):
+            TripPlan.objects.bulk_create(
+                [
+                    TripPlan.from_plan(trip, plan, trip_checkpoints)
+                    for trip, plan, trip_checkpoints in zip(trips, plans, checkpoints)
+                    if not isinstance(plan, Exception)
+                ]
+            )
+
+        for (index, _), trip, plan in zip(pending, trips, plans):
+            if isinstance(plan, Exception):
+                results[index] = {
+                    "index": index,
+                    "status": status.HTTP_502_BAD_GATEWAY,
+                    "trip": TripSerializer(trip).data,
+                    "error": str(plan),
+                }
             else:
-                _to = "Enroute"
+                _shape_plan(plan, options)
+                results[index] = {
+                    "index": index,
+                    "status": status.HTTP_201_CREATED,
+                    "trip": TripSerializer(trip).data,
+                    **plan,
+                }
+
+        succeeded = sum(1 for r in results if r["status"] == status.HTTP_201_CREATED)
+        return Response(
+            {
+                "message": f"Planned {succeeded} of {len(items)} trips",
+                "succeeded": succeeded,
+                "failed": len(items) - succeeded,
+                "results": results,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class TripDetailView(APIView):
+    """
+    Serve a previously planned trip straight from its stored TripPlan;
+    never calls Nominatim or OSRM. Accepts the same path and hos_format
+    query options as the create endpoint. Responses carry an ETag; a matching
+    If-None-Match gets 304 without loading the plan.
+    """
+
+    @method_decorator(condition(etag_func=_plan_etag))
+    def get(self, request, pk):
+        try:
+            options = _parse_options(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        trip_plan = TripPlan.objects.select_related("trip").filter(trip_id=pk).first()
+        if trip_plan is None:
+            return Response(
+                {"detail": "No stored plan for this trip."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        plan = trip_plan.as_plan()
+        _shape_plan(plan, options)
+
+        return Response({"trip": TripSerializer(trip_plan.trip).data, **plan})
+
+
+class TripHistoryPagination(CursorPagination):
+    # keyset on (created_at, id), served by the trip_created_idx index
+    ordering = ("-created_at", "-id")
+    page_size = getattr(settings, "TRIP_HISTORY_PAGE_SIZE", 50)
+    page_size_query_param = "limit"
+    max_page_size = getattr(settings, "TRIP_HISTORY_MAX_PAGE_SIZE", 200)
+
+
+class TripHistoryView(APIView):
+    """
+    Past trips, newest first, with their plan's distance and duration.
+    Filters: ?location= (any of the trip's locations), ?current_location=,
+    ?pickup_location=, ?dropoff_location= (exact strings, as entered),
+    ?created_after= (inclusive) and ?created_before= (exclusive) as ISO
+    dates or datetimes. Pages are cursor based: follow "next" rather
+    than counting offsets, so deep pages cost the same as the first.
+    """
+
+    LOCATION_FIELDS = ("current_location", "pickup_location", "dropoff_location")
+
+    def get(self, request):
+        params = request.query_params
+        trips = Trip.objects.annotate(
+            total_distance_miles=F("plan__total_distance_miles"),
+            total_duration_hours=F("plan__total_duration_hours"),
+        )
+
+        location = params.get("location")
+        if location:
+            trips = trips.filter(
+                Q(current_location=location)
+                | Q(pickup_location=location)
+                | Q(dropoff_location=location)
+            )
+        for field in self.LOCATION_FIELDS:
+            if params.get(field):
+                trips = trips.filter(**{field: params[field]})
 
-            totals = {
-                "DRIVING": 0.0,
-                "ON_DUTY": 0.0,
-                "OFF_DUTY": 0.0,
-                "SLEEPER_BERTH": 0.0,
+        for param, lookup in (
+            ("created_after", "created_at__gte"),
+            ("created_before", "created_at__lt"),
+        ):
+            if param not in params:
+                continue
+            moment = _parse_moment(params[param])
+            if moment is None:
+                return Response(
+                    {"detail": f"{param} must be an ISO date or datetime."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            trips = trips.filter(**{lookup: moment})
+
+        paginator = TripHistoryPagination()
+        page = paginator.paginate_queryset(trips, request, view=self)
+        return paginator.get_paginated_response(
+            TripHistorySerializer(page, many=True).data
+        )
+
+
+def _parse_moment(value):
+    """Aware datetime for an ISO date or datetime string, else None."""
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class TripReplanView(APIView):
+    """
+    Re-plan a stored trip from a given day with new remaining driving
+    hours (after a detour, a delay or a new route duration). The HOS
+    engine resumes from that day's stored checkpoint instead of day 1.
+    """
+
+    def post(self, request, pk):
+        try:
+            options = _parse_options(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = ReplanSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        trip_plan = TripPlan.objects.select_related("trip").filter(trip_id=pk).first()
+        if trip_plan is None:
+            return Response(
+                {"detail": "No stored plan for this trip."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if not trip_plan.hos_checkpoints:
+            return Response(
+                {"detail": "This plan has no HOS checkpoints to resume from."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        try:
+            plan, checkpoints = replan_trip(
+                trip_plan.trip,
+                trip_plan.as_plan(),
+                trip_plan.hos_checkpoints,
+                data["from_day"],
+                data["remaining_trip_hours"],
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        route_info = plan["route_info"]
+        trip_plan.total_duration_hours = route_info["total_duration_hours"]
+        trip_plan.rest_stops = route_info["rest_stops"]
+        trip_plan.hos_logs = plan["hos_logs"]
+        trip_plan.hos_checkpoints = checkpoints
+        trip_plan.save(
+            update_fields=[
+                "total_duration_hours",
+                "rest_stops",
+                "hos_logs",
+                "hos_checkpoints",
+                "updated_at",
+            ]
+        )
+
+        _shape_plan(plan, options)
+        return Response(
+            {
+                "message": "Trip re-planned",
+                "trip": TripSerializer(trip_plan.trip).data,
+                **plan,
             }
-            driving_miles_accum = 0.0
-            for act in entry["activities"]:
-                typ = act["type"]
-                dur = act.get("duration", 0.0)
-                if typ == "DRIVING":
-                    totals["DRIVING"] += dur
-                    driving_miles_accum += dur * avg_speed
-                elif typ == "ON_DUTY":
-                    totals["ON_DUTY"] += dur
-                elif typ == "OFF_DUTY":
-                    totals["OFF_DUTY"] += dur
-                elif typ == "SLEEPER_BERTH":
-                    totals["SLEEPER_BERTH"] += dur
-
-                # detect rest stops (SLEEPER_BERTH and OFF_DUTY of significant length)
-                if typ == "SLEEPER_BERTH" and dur > 0:
-                    mile_marker = round(
-                        cumulative_miles_before + driving_miles_accum, 2
-                    )
-                    rest_stops.append(
-                        {
-                            "day": entry["day"],
-                            "type": "SLEEPER_BERTH",
-                            "start": act.get("start"),
-                            "duration": dur,
-                            "mile_marker": mile_marker,
-                        }
-                    )
-                if typ == "OFF_DUTY" and dur >= 0.5:
-                    mile_marker = round(
-                        cumulative_miles_before + driving_miles_accum, 2
-                    )
-                    rest_stops.append(
-                        {
-                            "day": entry["day"],
-                            "type": "OFF_DUTY",
-                            "start": act.get("start"),
-                            "duration": dur,
-                            "mile_marker": mile_marker,
-                        }
-                    )
-
-            cumulative_miles_before += entry.get("miles_driven", 0.0)
-
-            enriched = {
-                "day": entry["day"],
-                "date": the_date.isoformat(),
-                "from": _from,
-                "to": _to,
-                "total_miles_driving_today": entry.get("miles_driven", 0.0),
-                "total_hours": entry.get("total_hours", 0.0),
-                "driving_hours": entry.get("driving_hours", 0.0),
-                "on_duty_hours": entry.get("on_duty_hours", 0.0),
-                "off_duty_hours": entry.get("off_duty_hours", 0.0),
-                "sleeper_hours": entry.get("sleeper_hours", 0.0),
-                "totals": totals,
-                "activities": entry["activities"],
+        )
+
+
+def _job_payload(job, options):
+    payload = job_status(job)
+    if job.status == TripJob.SUCCEEDED:
+        trip_plan = TripPlan.objects.filter(trip_id=job.trip_id).first()
+        if trip_plan is not None:
+            plan = trip_plan.as_plan()
+            _shape_plan(plan, options)
+            payload["result"] = {"trip": TripSerializer(job.trip).data, **plan}
+    return payload
+
+
+class TripJobDetailView(APIView):
+    """Poll a planning job; the finished plan is included once it succeeds."""
+
+    def get(self, request, job_id):
+        try:
+            options = _parse_options(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        job = TripJob.objects.select_related("trip").filter(pk=job_id).first()
+        if job is None:
+            return Response(
+                {"detail": "Job not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(_job_payload(fail_if_stale(job), options))
+
+
+class TripJobEventsView(APIView):
+    """
+    Server-sent events for a planning job: a "progress" event per stage,
+    then "done" (with the result) or "error".
+
+    The stream polls the database from a worker thread, so each open
+    stream holds one thread for up to JOB_EVENTS_MAX_SECONDS. Size the
+    server's threads for the expected streams, or have clients poll
+    TripJobDetailView instead.
+    """
+
+    def get(self, request, job_id):
+        try:
+            options = _parse_options(request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not TripJob.objects.filter(pk=job_id).exists():
+            return Response(
+                {"detail": "Job not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        def stream():
+            for event, job in iter_job_events(job_id):
+                if job is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event == "done":
+                    data = _job_payload(job, options)
+                else:
+                    data = job_status(job)
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+        response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class HOSSweepView(APIView):
+    """
+    What-if HOS sweep over a grid of cycle hours already used (rows) and
+    trip driving hours (columns). Returns compact matrices rather than
+    activity lists.
+    """
+
+    def post(self, request):
+        serializer = HOSSweepSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        cells = len(data["cycle_used_hours"]) * len(data["trip_hours"])
+        max_cells = getattr(settings, "HOS_SWEEP_MAX_CELLS", 200_000)
+        if cells > max_cells:
+            return Response(
+                {"detail": f"A sweep may evaluate at most {max_cells} cells."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        from .services.hos_sweep import sweep_hos  # numpy, only needed here
+
+        result = sweep_hos(
+            data["cycle_used_hours"],
+            data["trip_hours"],
+            avg_speed_mph=data["avg_speed_mph"],
+            fuel_stops=data["fuel_stops"],
+        )
+        return Response(
+            {
+                "cycle_used_hours": data["cycle_used_hours"],
+                "trip_hours": data["trip_hours"],
+                "days_needed": result["days_needed"].tolist(),
+                "arrival_day": result["arrival_day"].tolist(),
+                "cycle_exhausted": result["cycle_exhausted"].astype(int).tolist(),
             }
-            enriched_logs.append(enriched)
+        )
 
+
+class LocationAutocompleteView(APIView):
+    """
+    Location suggestions for the trip form, from the local gazetteer only
+    (never Nominatim): GET ?q=<prefix>&limit=<1-20>.
+    """
+
+    def get(self, request):
+        query = request.query_params.get("q", "")
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_SUGGESTIONS:
+            return Response(
+                {"detail": f"limit must be between 1 and {MAX_SUGGESTIONS}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        gazetteer = get_gazetteer()
+        entries = gazetteer.suggest(query, limit) if gazetteer is not None else []
+        return Response(
+            {"query": query, "results": [entry.as_dict() for entry in entries]}
+        )
+
+
+class CacheStatsView(APIView):
+    def get(self, request):
+        gazetteer = get_gazetteer()
         return Response(
             {
-                "message": "Trip created successfully",
-                "trip": TripSerializer(trip).data,
-                "route_info": {
-                    "total_distance_miles": distance,
-                    "total_duration_hours": duration,
-                    "fuel_stops": fuel_stops,
-                    "path": path,
-                    "waypoints": waypoints,
-                    "rest_stops": rest_stops,
-                },
-                "hos_logs": enriched_logs,
-            },
-            status=status.HTTP_201_CREATED,
+                "geocode": geocode_cache.stats(),
+                "gazetteer": gazetteer.stats() if gazetteer is not None else None,
+                "route": route_cache.stats(),
+                "hos": hos_memo.stats(),
+                "osrm_breaker": osrm_breaker.stats(),
+                "idempotency": idempotency_store.stats(),
+            }
+        )
+
+
+class MetricsView(View):
+    """Stage timings and upstream counters in the Prometheus text format."""
+
+    def get(self, request):
+        if not metrics.enabled():
+            raise Http404
+        return HttpResponse(
+            metrics.render_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
         )
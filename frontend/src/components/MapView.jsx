@@ -75,15 +75,19 @@ const MapView = ({
 
   const markers = [path[0], path[path.length - 1]];
 
-  // compute cumulative miles along path
-  const cumulative = [0];
-  for (let i = 1; i < path.length; i++) {
-    const seg = haversineMiles(path[i - 1], path[i]);
-    cumulative.push(cumulative[cumulative.length - 1] + seg);
-  }
+  // cumulative miles along path, only built if a stop lacks a location
+  let cumulative = null;
+  const buildCumulative = () => {
+    cumulative = [0];
+    for (let i = 1; i < path.length; i++) {
+      const seg = haversineMiles(path[i - 1], path[i]);
+      cumulative.push(cumulative[cumulative.length - 1] + seg);
+    }
+  };
 
   const findPointAtMile = (mile) => {
     if (mile <= 0) return path[0];
+    if (cumulative === null) buildCumulative();
     for (let i = 1; i < cumulative.length; i++) {
       if (cumulative[i] >= mile) {
         const prev = cumulative[i - 1];
@@ -96,17 +100,18 @@ const MapView = ({
     return path[path.length - 1];
   };
 
+  // stops come with a server-side location; older plans only have a mile marker
   const fuelMarkers = (fuelStops || []).map((fs) => {
     const mile = fs.mile_marker || 0;
     return {
       ...fs,
-      coord: findPointAtMile(mile),
+      coord: fs.location || findPointAtMile(mile),
     };
   });
 
   const restMarkers = (restStops || []).map((rs) => ({
     ...rs,
-    coord: findPointAtMile(rs.mile_marker || 0),
+    coord: rs.location || findPointAtMile(rs.mile_marker || 0),
   }));
 
   const center = path[0];